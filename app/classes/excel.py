@@ -0,0 +1,221 @@
+from datetime import date
+from io import BytesIO
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from .year import CalYear, Day, DayType
+from . import metrics
+
+# Fill color of each DayType in exported workbooks
+DAY_TYPE_COLORS = {
+    DayType.NONE: "FFFFFF",  # White
+    DayType.AWD: "CCE5FF",   # Light blue
+    DayType.ID: "EFEF95",    # Yellow
+    DayType.CONVOCATION: "50E3C2",
+    DayType.FINALS: "F8CBAD",
+    DayType.NO_CLASS_CAMPUS_OPEN: "AE76C7",
+    DayType.COMMENCEMENT: "BD10E0",
+    DayType.SUMMER_SESSION: "C5E0B4",
+    DayType.WINTER_SESSION: "CFCFCF",
+    DayType.HOLIDAY: "FFC107",
+    DayType.VOID: "BDBDBD"
+}
+
+# Style palette shared by every cell of every sheet, built once per process
+FILLS = {day_type: PatternFill(start_color=color, end_color=color, fill_type="solid") for day_type, color in DAY_TYPE_COLORS.items()}
+BOLD = Font(bold=True)
+ITALIC = Font(italic=True)
+CENTER = Alignment(horizontal="center")
+LEFT = Alignment(horizontal="left")
+
+DAY_NAMES = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+TABLE_HEADERS = ['Fall', 'AWD', 'ID', 'Spring', 'AWD', 'ID']
+TABLE_HEADER_FILLS = [FILLS[DayType.VOID], FILLS[DayType.AWD], FILLS[DayType.ID]] * 2
+
+# Columns of the sweep summary sheet after the option number and its parameters: header and CalYear attribute
+SUMMARY_COLUMNS = [
+    ("Convocation", "convocation_day"),
+    ("Fall Start", "fall_semester_start"),
+    ("Winter Start", "winter_session_start"),
+    ("Spring Start", "spring_semester_start"),
+    ("Commencement", "commencement_start"),
+    ("Summer Start", "summer_session_start"),
+    ("Summer End", "summer_session_end"),
+    ("AWD", "num_awd"),
+    ("ID", "num_id"),
+    ("Winter ID", "winter_session_id"),
+    ("Summer ID", "summer_session_id"),
+]
+PARAMETER_HEADERS = ["Option", "AWD Target", "ID Target", "Convocation Offset", "Winter Length"]
+
+# Sheet layout: three months per row of blocks, each block 11 rows high and 8 columns wide
+START_ROW = 2
+START_COL = 1
+MONTHS_PER_ROW = 3
+ROWS_PER_MONTH = 11
+COLS_PER_MONTH = 8
+
+
+class _Sheet:
+    """ Cells of one worksheet collected by position, so they can be written out row by row """
+    def __init__(self):
+        self.rows = {}
+
+    def put(self, row: int, col: int, value=None, font: Font = None, fill: PatternFill = None, alignment: Alignment = None):
+        self.rows.setdefault(row, {})[col] = (value, font, fill, alignment)
+
+    def write(self, ws):
+        # styles are the shared palette objects above, openpyxl stores each distinct one once per workbook
+        for row in range(1, max(self.rows, default=0) + 1):
+            cells = self.rows.get(row)
+            if not cells:
+                ws.append([])
+                continue
+            values = [None] * max(cells)
+            for col, (value, font, fill, alignment) in cells.items():
+                if font is None and fill is None and alignment is None:
+                    values[col - 1] = value
+                    continue
+                cell = WriteOnlyCell(ws, value=value)
+                if font is not None:
+                    cell.font = font
+                if fill is not None:
+                    cell.fill = fill
+                if alignment is not None:
+                    cell.alignment = alignment
+                values[col - 1] = cell
+            ws.append(values)
+
+
+def _month_blocks(sheet: _Sheet, calyear: CalYear):
+    for month_index, cal_month in enumerate(calyear.months):
+        row_offset = START_ROW + (month_index // MONTHS_PER_ROW) * ROWS_PER_MONTH
+        col_offset = START_COL + (month_index % MONTHS_PER_ROW) * COLS_PER_MONTH
+
+        sheet.put(row_offset, col_offset, cal_month.get_title(), font=BOLD)
+        for col, day_name in enumerate(DAY_NAMES, start=col_offset):
+            sheet.put(row_offset + 1, col, day_name, alignment=CENTER)
+
+        for week_row, week in enumerate(cal_month.cal, start=row_offset + 2):
+            for day_col, day in enumerate(week, start=col_offset):
+                if day == 0:
+                    continue
+                day_type = calyear.cal_dict.get(date(cal_month.year, cal_month.month, day))
+                if day_type is None:
+                    sheet.put(week_row, day_col, day)
+                else:
+                    font = BOLD if day_type in (DayType.HOLIDAY, DayType.COMMENCEMENT) else None
+                    sheet.put(week_row, day_col, day, font=font, fill=FILLS[day_type])
+
+        # The note goes on the row after the 6th week
+        stats = calyear.month_stats.get(date(cal_month.year, cal_month.month, 1), {})
+        note_text = ", ".join(f"{key}={stats[key]}" for key in ("AWD", "ID", "SUM", "WIN") if stats.get(key))
+        if note_text:
+            sheet.put(row_offset + 2 + 6, col_offset, note_text, font=ITALIC)
+
+
+def _legend(sheet: _Sheet, calyear: CalYear):
+    legend_col = START_COL + MONTHS_PER_ROW * COLS_PER_MONTH
+    for index, day_type in enumerate(DAY_TYPE_COLORS):
+        sheet.put(START_ROW + index, legend_col, day_type.name, alignment=LEFT)
+        sheet.put(START_ROW + index, legend_col + 1, fill=FILLS[day_type])
+
+    summary_row = START_ROW + len(DAY_TYPE_COLORS) + 2
+    sheet.put(summary_row, legend_col, f"Academic Work Days = {calyear.num_awd}", font=BOLD)
+    sheet.put(summary_row + 1, legend_col, f"Instructional Days = {calyear.num_id}", font=BOLD)
+    sheet.put(summary_row + 2, legend_col, f"Winter Session = {calyear.winter_session_id}", font=BOLD)
+    sheet.put(summary_row + 3, legend_col, f"Summer Session = {calyear.summer_session_id}", font=BOLD)
+
+
+def _table(sheet: _Sheet, row: int, fall: list, spring: list) -> int:
+    """ Fall and spring (label, AWD, ID) rows side by side under the colored headers, returns the row after the table """
+    for col, (header, fill) in enumerate(zip(TABLE_HEADERS, TABLE_HEADER_FILLS), start=START_COL):
+        sheet.put(row, col, header, font=BOLD, fill=fill)
+    for side, entries in ((0, fall), (3, spring)):
+        for idx, entry in enumerate(entries, start=row + 1):
+            for col, value in enumerate(entry, start=START_COL + side):
+                sheet.put(idx, col, value)
+    return row + 1 + max(len(fall), len(spring))
+
+
+def _with_total(entries: list) -> list:
+    return entries + [('Total', sum(entry[1] for entry in entries), sum(entry[2] for entry in entries))]
+
+
+def _tables(sheet: _Sheet, calyear: CalYear):
+    # Fall runs August to December of the first year, spring January to May
+    fall = []
+    spring = []
+    aug_count = 0
+    for cal_month in calyear.months:
+        if cal_month.month == 8:
+            aug_count += 1
+        stats = calyear.month_stats.get(date(cal_month.year, cal_month.month, 1), {})
+        entry = (cal_month.get_abbr(), stats.get('AWD', 0), stats.get('ID', 0))
+        if cal_month.month in (8, 9, 10, 11, 12) and aug_count < 2:
+            fall.append(entry)
+        elif cal_month.month in (1, 2, 3, 4, 5):
+            spring.append(entry)
+
+    num_rows_of_months = (len(calyear.months) + MONTHS_PER_ROW - 1) // MONTHS_PER_ROW
+    row = START_ROW + num_rows_of_months * ROWS_PER_MONTH + 3
+    row = _table(sheet, row, _with_total(fall), _with_total(spring))
+
+    days = ['M', 'T', 'W', 'R', 'F', 'Sa']
+    fall_days = [(name, calyear.day_awd_count['fall'].get(Day(i), 0), calyear.day_id_count['fall'].get(Day(i), 0))
+                 for i, name in enumerate(days)]
+    spring_days = [(name, calyear.day_awd_count['spring'].get(Day(i), 0), calyear.day_id_count['spring'].get(Day(i), 0))
+                   for i, name in enumerate(days)]
+    _table(sheet, row + 2, _with_total(fall_days), _with_total(spring_days))
+
+
+def add_calendar_sheet(wb: Workbook, calyear: CalYear, title: str = "Academic Calendar"):
+    """ Append a sheet with the colored calendar, legend, summary and tables of a computed schedule
+    to a write-only workbook """
+    sheet = _Sheet()
+    _month_blocks(sheet, calyear)
+    _legend(sheet, calyear)
+    _tables(sheet, calyear)
+    sheet.write(wb.create_sheet(title=title))
+
+
+def calendar_workbook(calyear: CalYear) -> BytesIO:
+    """ Workbook of one computed schedule, ready to be sent """
+    with metrics.timer("excel"):
+        wb = Workbook(write_only=True)
+        add_calendar_sheet(wb, calyear)
+        output = BytesIO()
+        wb.save(output)
+    output.seek(0)
+    return output
+
+
+def sweep_workbook(schedules) -> BytesIO:
+    """ One workbook for a whole sweep: a summary sheet comparing every option, then one sheet per option.
+    `schedules` yields (hash, parameters, calyear) in option order """
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet(title="Summary")
+    headers = PARAMETER_HEADERS + [header for header, _ in SUMMARY_COLUMNS] + ["Hash"]
+    for col in range(1, len(headers)):
+        summary.column_dimensions[get_column_letter(col)].width = 14
+    summary.column_dimensions[get_column_letter(len(headers))].width = 36
+
+    sheet = _Sheet()
+    for col, header in enumerate(headers, start=1):
+        sheet.put(1, col, header, font=BOLD, fill=FILLS[DayType.VOID])
+    sheet.write(summary)
+
+    for number, (md5_hash, parameters, calyear) in enumerate(schedules, start=1):
+        row = [number, parameters["awd"], parameters["id"], parameters["convo_day"], parameters["winter_sess"]]
+        row += [getattr(calyear, attribute) for _, attribute in SUMMARY_COLUMNS]
+        # rows of the summary and the option sheets are streamed side by side
+        summary.append(row + [md5_hash])
+        with metrics.timer("excel_sheet"):
+            add_calendar_sheet(wb, calyear, title=f"Option {number}")
+
+    output = BytesIO()
+    with metrics.timer("excel_save"):
+        wb.save(output)
+    output.seek(0)
+    return output
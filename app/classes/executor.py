@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Overloaded(Exception):
+    """ A request was turned away: 429 when the queue is full, 503 while shutting down """
+    def __init__(self, status_code: int, detail: str, retry_after: int = 1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """ Thread pool shared by the endpoints for their CPU-bound work, so the event loop stays free.
+    At most `workers` jobs run at once and `max_queue` more may wait; anything beyond that is
+    rejected right away instead of piling up behind the others. """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.completed = 0
+        self.rejected = 0
+        self._active = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-request")
+
+    def acquire(self):
+        """ Take a slot for one job, or raise Overloaded """
+        with self._lock:
+            if self._closed:
+                raise Overloaded(503, "Server is shutting down")
+            if self._active >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(429, "Too many calendar requests in progress, try again shortly")
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self.completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """ Run func(*args, **kwargs) on the pool and wait for it without blocking the event loop """
+        self.acquire()
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except RuntimeError:
+            self.release()
+            raise Overloaded(503, "Server is shutting down")
+        # the slot is freed when the job ends, even if the client went away before that
+        future.add_done_callback(lambda _: self.release())
+        return await asyncio.wrap_future(future)
+
+    def stream(self, iterator):
+        """ Admit a streamed response: the slot is taken now and held until the returned iterator is exhausted
+        or closed. The response must close it however it ends, a client can go away before the first chunk. """
+        self.acquire()
+        return _Held(self, iterator)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Held:
+    """ Iterator of a streamed response, holding one executor slot """
+
+    def __init__(self, executor: BoundedExecutor, iterator):
+        self._executor = executor
+        self._iterator = iter(iterator)
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """ Give the slot back (only the first call does) and stop the underlying generator """
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._executor.release()
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # still running on a request thread, it stops at its next yield when it is collected
+                pass
+
+
+def get_executor() -> BoundedExecutor:
+    """ Process-wide request executor, sized by CALENDAR_REQUEST_THREADS and CALENDAR_REQUEST_QUEUE """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            try:
+                workers = int(os.environ.get("CALENDAR_REQUEST_THREADS", "4"))
+                max_queue = int(os.environ.get("CALENDAR_REQUEST_QUEUE", "16"))
+            except ValueError:
+                workers, max_queue = 4, 16
+            _executor = BoundedExecutor(max(1, workers), max(0, max_queue))
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,34 @@
+import calendar
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = "fonts/OpenSans-Regular.ttf"
+FONT_PATH_BOLD = "fonts/OpenSans-Bold.ttf"
+
+# Scratch canvas used only to measure text
+_measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+@lru_cache(maxsize=None)
+def get_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """ Shared font for a path and size, loaded from disk once per process """
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=4096)
+def text_size(font: ImageFont.FreeTypeFont, text: str) -> tuple:
+    """ Width and height of the text's bounding box, as draw.textbbox would measure it """
+    bbox = _measure_draw.textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def prime_metrics(fonts: list, years: list = ()):
+    """ Pre-measure the day numbers, weekday headers and month titles that CalMonth.draw uses """
+    for font in fonts:
+        for day in range(1, 32):
+            text_size(font, str(day))
+        for day_name in calendar.day_abbr:
+            text_size(font, day_name)
+        for year in years:
+            for month in range(1, 13):
+                text_size(font, calendar.month_name[month] + " " + str(year))
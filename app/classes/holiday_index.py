@@ -0,0 +1,54 @@
+import holidays
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Holidays observed by the campus, as named by the holidays package
+HOLIDAY_LIST = ['Martin Luther King Jr. Day', 'Labor Day', 'Thanksgiving', 'Day After Thanksgiving', 'New Year\'s Day', 'New Year\'s Day (Observed)', 'Independence Day', 'Independence Day (Observed)', 'Cesar Chavez Day', 'Cesar Chavez Day (Observed)', 'Veterans Day', 'Veterans Day (Observed)', 'Christmas Day', 'Christmas Day (Observed)', 'Memorial Day', 'Juneteenth National Independence Day']
+
+
+class HolidayIndex:
+    """ Holidays for the academic year starting in the fall of `year`, resolved once.
+    Instances are shared by every CalYear for that year and must be treated as read-only. """
+
+    def __init__(self, year: int):
+        self.year = year
+        us_holidays = holidays.country_holidays('US') + holidays.country_holidays('US','CA') + holidays.country_holidays('US','VI')
+        # Load the fall year, then the spring year
+        date(year, 1, 1) in us_holidays
+        date(year + 1, 1, 1) in us_holidays
+
+        # Every campus holiday in both calendar years
+        self.dates = frozenset(
+            the_date for the_date, names in us_holidays.items()
+            if any(holiday_name in names for holiday_name in HOLIDAY_LIST)
+        )
+
+        self.christmas = self._first(us_holidays, "Christmas Day", year)
+        self.thanksgiving = self._first(us_holidays, "Thanksgiving", year)
+        self.mlk_day = self._first(us_holidays, "Martin Luther King Jr. Day", year + 1)
+        self.easter_monday = self._first(us_holidays, "Easter Monday", year + 1)
+        self.memorial_day = self._first(us_holidays, "Memorial Day", year + 1)
+
+        # Cesar Chavez Day, moved to the nearest weekday when it falls on a weekend
+        self.cesar_chavez = self._first(us_holidays, "Cesar Chavez Day", year + 1)
+        if self.cesar_chavez is not None:
+            if self.cesar_chavez.weekday() == 5:  # Saturday, move to Monday
+                self.cesar_chavez = self.cesar_chavez + timedelta(days=2)
+            elif self.cesar_chavez.weekday() == 6:  # Sunday, move to Friday
+                self.cesar_chavez = self.cesar_chavez + timedelta(days=-2)
+
+    def is_holiday(self, the_date: date) -> bool:
+        return the_date in self.dates
+
+    @staticmethod
+    def _first(us_holidays, name: str, year: int) -> date | None:
+        for the_date in us_holidays.get_named(name):
+            if the_date.year == year:
+                return the_date
+        return None
+
+
+@lru_cache(maxsize=64)
+def get_holiday_index(year: int) -> HolidayIndex:
+    """ Process-wide HolidayIndex for the academic year starting in the fall of `year` """
+    return HolidayIndex(year)
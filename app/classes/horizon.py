@@ -0,0 +1,72 @@
+import base64
+import calendar
+from datetime import date, timedelta
+from .year import CalYear, Calendar_Input
+from . import search
+
+# Longest horizon accepted by plan_horizon
+MAX_YEARS = 30
+
+# Key dates reported for the schedule picked in each year
+SUMMARY_FIELDS = ("convocation_day", "fall_semester_start", "spring_semester_start", "commencement_start",
+                  "summer_session_start", "summer_session_end", "num_awd", "num_id")
+
+
+def year_inputs(template: Calendar_Input, year: int) -> list:
+    """ The template's rules for every weekday fall start date CalYear accepts in `year`,
+    closest to the template's start day first. A start day the year does not have (February 29th) counts as
+    the last day of its month. """
+    preferred = date(year, template.month, min(template.day, calendar.monthrange(year, template.month)[1]))
+    days = [date(year, 8, 15) + timedelta(days=i) for i in range(17)]
+    days = sorted((day for day in days if day.weekday() < 5), key=lambda day: (abs((day - preferred).days), day))
+    return [template.model_copy(update={"year": day.year, "month": day.month, "day": day.day}) for day in days]
+
+
+def plan_horizon(template: Calendar_Input, years: int = 10, render_years: list = (), workers: int = None) -> list:
+    """ Plan `years` consecutive academic years with the template's rules, starting with the fall of template.year.
+    Every candidate start date of every year is swept in one pass over the process pool, then the years are linked
+    in order: each year takes the start date closest to the template's day that comes after the previous year's
+    summer session, and the first unique schedule of that date. Only the years in render_years get an image. """
+    years = min(years, MAX_YEARS)
+    per_year = [year_inputs(template, template.year + offset) for offset in range(years)]
+    sweeps = search.batch_sweeps([req for reqs in per_year for req in reqs], workers)
+
+    plan = []
+    previous_summer_end = None
+    idx = 0
+    for offset, reqs in enumerate(per_year):
+        year_sweeps = sweeps[idx:idx + len(reqs)]
+        idx += len(reqs)
+        entry = {
+            "year": template.year + offset,
+            "feasible_start_dates": sum(1 for sweep in year_sweeps if sweep["schedules"]),
+            "start_date": None
+        }
+        plan.append(entry)
+
+        chosen = None
+        for req, sweep in zip(reqs, year_sweeps):
+            start_date = date(req.year, req.month, req.day)
+            if sweep["schedules"] and (previous_summer_end is None or start_date > previous_summer_end):
+                chosen = (req, sweep)
+                break
+        if chosen is None:
+            # nothing to link the next year to, it is planned on its own
+            previous_summer_end = None
+            continue
+
+        req, sweep = chosen
+        schedule = sweep["schedules"][0]
+        parameters = schedule["parameters"]
+        params = (parameters["awd"], parameters["id"], parameters["convo_day"], parameters["winter_sess"])
+        calyear = CalYear(req)
+        calyear.compute_schedule(*params, convocation_day=date.fromisoformat(parameters["convocation_date"]))
+        data = calyear.schedule_data()
+        previous_summer_end = calyear.summer_session_end
+
+        entry.update(start_date=data["start_date"], options=len(sweep["schedules"]), hash=schedule["hash"], parameters=parameters)
+        entry.update({field: data[field] for field in SUMMARY_FIELDS})
+        if entry["year"] in render_years:
+            png = search.render_cached(req, calyear, schedule["hash"], params)
+            entry["image"] = base64.b64encode(png).decode("utf-8")
+    return plan
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from .year import Calendar_Input
+from .executor import Overloaded
+from .memo import input_digest
+from . import search
+
+# Jobs that are still waiting or running
+ACTIVE_STATES = ("queued", "running")
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class Job:
+    """ One build_years sweep run in the background, with its live progress and the calendars found so far """
+
+    def __init__(self, req: Calendar_Input):
+        self.id = uuid.uuid4().hex
+        self.req = req
+        self.digest = input_digest(req)
+        self.status = "queued"
+        self.error = None
+        self.total = len(search.parameter_grid())
+        # filled in by iter_years while the sweep runs
+        self.stats = {}
+        self.results = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def eta(self) -> float | None:
+        """ Seconds left, extrapolated from the candidates searched and then from the calendars drawn """
+        if not self.active:
+            return 0.0
+        elapsed = self.elapsed()
+        candidates = self.stats.get("candidates", 0)
+        if candidates < self.total:
+            # drawing overlaps the search, so this is a lower bound until the search is over
+            return elapsed * (self.total - candidates) / candidates if candidates else None
+        drawn = len(self.results)
+        return elapsed * (self.stats.get("unique", 0) - drawn) / drawn if drawn else None
+
+    def snapshot(self, since: int = 0) -> dict:
+        """ Status, progress and the calendars found from index `since` on """
+        # status first: once it reads finished, every result is already in the list
+        status = self.status
+        results = self.results[since:]
+        eta = self.eta()
+        return {
+            "job_id": self.id,
+            "status": status,
+            "error": self.error,
+            "progress": {
+                "total": self.total,
+                "candidates": self.stats.get("candidates", 0),
+                "evaluated": self.stats.get("evaluated", 0),
+                "pruned": dict(self.stats.get("pruned", {})),
+                "failures": dict(self.stats.get("failures", {})),
+                "unique": self.stats.get("unique", 0),
+                "drawn": len(self.results),
+                "memoized": self.stats.get("memoized", False)
+            },
+            "elapsed": round(self.elapsed(), 3),
+            "eta": round(eta, 1) if eta is not None else None,
+            "results": results,
+            "next": since + len(results)
+        }
+
+    def run(self):
+        if self.cancelled.is_set():
+            # cancelled while queued
+            return
+        self.status = "running"
+        self.started = time.time()
+        try:
+            # images end up in the render cache, results only carry their URLs, which can draw them again
+            # once the cache has dropped them; the sweep itself stops shortly after a cancel
+            results = search.iter_years(self.req, stats=self.stats, raw=True, size="thumb", cancelled=self.cancelled)
+            for result in results:
+                if self.cancelled.is_set():
+                    results.close()
+                    break
+                parameters = result["parameters"]
+                convocation_day = date.fromisoformat(parameters["convocation_date"])
+                self.results.append({
+                    "parameters": parameters,
+                    "hash": result["hash"],
+                    **search.image_urls(self.req, result["hash"], search.params_from(parameters), convocation_day)
+                })
+            self.status = "cancelled" if self.cancelled.is_set() else "done"
+        except Exception as exc:
+            self.error = str(exc)
+            self.status = "failed"
+        finally:
+            self.finished = time.time()
+
+
+class JobStore:
+    """ Jobs kept in memory, run `workers` at a time on their own threads.
+    At most max_active jobs may be queued or running, finished jobs are forgotten ttl seconds after they end. """
+
+    def __init__(self, workers: int, max_active: int, ttl: float):
+        self.workers = workers
+        self.max_active = max_active
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-job")
+
+    def submit(self, req: Calendar_Input) -> Job:
+        """ Queue a sweep, or hand back the job already working on the same input """
+        digest = input_digest(req)
+        with self._lock:
+            self._expire()
+            active = [job for job in self._jobs.values() if job.active]
+            for job in active:
+                if job.digest == digest:
+                    return job
+            if len(active) >= self.max_active:
+                raise Overloaded(429, "Too many calendar jobs in progress, try again shortly", retry_after=5)
+            job = Job(req)
+            self._jobs[job.id] = job
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self.get(job_id)
+        if job is not None and job.active:
+            # a queued job never starts, a running one stops after its next calendar
+            job.cancelled.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.time()
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = [job.status for job in self._jobs.values()]
+        return {state: states.count(state) for state in ("queued", "running", "done", "failed", "cancelled")}
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished + self.ttl < now]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_job_store() -> JobStore:
+    """ Process-wide job store, configured by CALENDAR_JOB_WORKERS, CALENDAR_JOB_MAX and CALENDAR_JOB_TTL (seconds) """
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                workers = int(os.environ.get("CALENDAR_JOB_WORKERS", "2"))
+                max_active = int(os.environ.get("CALENDAR_JOB_MAX", "32"))
+                ttl = float(os.environ.get("CALENDAR_JOB_TTL", "3600"))
+            except ValueError:
+                workers, max_active, ttl = 2, 32, 3600
+            _store = JobStore(max(1, workers), max(1, max_active), ttl)
+        return _store
+
+
+def shutdown_job_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.shutdown()
+            _store = None
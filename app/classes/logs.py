@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+# Every module logs under this logger, as calendar.<module>
+ROOT_LOGGER = "calendar"
+
+# Records waiting for the writer thread; past that, new records are dropped instead of blocking the caller
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has, anything else on a record came in through `extra` and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """ `time level logger message key=value ...`, one line per record """
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in _fields(record).items())
+        return f"{line} {fields}" if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record, structured fields at the top level """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ Hands records to the writer thread without ever waiting on it """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _level() -> int:
+    level = logging.getLevelName(os.environ.get("CALENDAR_LOG_LEVEL", "WARNING").upper())
+    return level if isinstance(level, int) else logging.WARNING
+
+
+def _install():
+    """ Route the calendar logger through a queue to stderr, written by a listener thread of this process """
+    global _listener
+    formatter = JsonFormatter() if os.environ.get("CALENDAR_LOG_FORMAT", "").lower() == "json" else KeyValueFormatter()
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+    log_queue = queue.Queue(QUEUE_SIZE)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DroppingQueueHandler(log_queue))
+    root.setLevel(_level())
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def _after_fork():
+    # the listener thread does not survive a fork, pool workers start their own
+    global _listener
+    if _configured:
+        _listener = None
+        _install()
+
+
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """ Logger for one module, configured on first use by CALENDAR_LOG_LEVEL (defaults to WARNING, the scheduling
+    rules only log at DEBUG so sweeps stay silent) and CALENDAR_LOG_FORMAT ("json", otherwise key=value text) """
+    global _configured
+    with _configure_lock:
+        if not _configured:
+            _install()
+            _configured = True
+            atexit.register(_stop)
+            os.register_at_fork(after_in_child=_after_fork)
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pydantic import BaseModel
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def input_digest(req: BaseModel) -> str:
+    """ Canonical digest of a request model: the same field values always give the same digest """
+    encoded = json.dumps(req.model_dump(), sort_keys=True, default=str).encode()
+    return hashlib.md5(encoded).hexdigest()
+
+
+class SweepMemo:
+    """ Results of whole sweeps in memory, keyed by input digest.
+    Entries expire ttl seconds after they were stored, and the least recently used entry
+    is dropped once there are more than max_entries. """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                # expired
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
+
+
+def get_sweep_memo() -> SweepMemo | None:
+    """ Process-wide sweep memo, configured by CALENDAR_MEMO_ENTRIES (0 disables it) and CALENDAR_MEMO_TTL (seconds) """
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            try:
+                max_entries = int(os.environ.get("CALENDAR_MEMO_ENTRIES", "128"))
+                ttl = float(os.environ.get("CALENDAR_MEMO_TTL", "3600"))
+            except ValueError:
+                max_entries, ttl = 128, 3600
+            if max_entries <= 0:
+                return None
+            _memo = SweepMemo(max_entries, ttl)
+        return _memo
@@ -0,0 +1,156 @@
+import bisect
+import contextlib
+import multiprocessing as mp
+import os
+import threading
+import time
+
+# Metrics are only collected with CALENDAR_METRICS=1, otherwise every call below returns right away
+ENABLED = os.environ.get("CALENDAR_METRICS", "").lower() in ("1", "true", "yes")
+
+# Type and help text of every metric
+METRICS = {
+    "calendar_stage_seconds": ("histogram", "Time spent in one stage of computing, drawing or exporting a calendar"),
+    "calendar_request_seconds": ("histogram", "Time to answer an HTTP request, by route"),
+    "calendar_candidates_total": ("counter", "Sweep candidates, by the stage they were pruned at (none if fully evaluated)"),
+    "calendar_schedules_total": ("counter", "Schedules found by sweeps: valid, unique or duplicate of an earlier candidate"),
+    "calendar_rule_failures_total": ("counter", "Scheduling rule failures, by reason"),
+    "calendar_cache_requests_total": ("counter", "Render cache lookups, by tier, kind and result"),
+    "calendar_sweep_memo_requests_total": ("counter", "Sweep memo lookups: hit, shared (from another process) or miss"),
+}
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_null_timer = contextlib.nullcontext()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(BUCKETS, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("calendar_stage_seconds", time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+def timer(stage: str):
+    """ Context manager timing one stage into calendar_stage_seconds """
+    if not ENABLED:
+        return _null_timer
+    return _Timer(stage)
+
+
+def _after_fork():
+    # a pool worker starts empty, or its first drain would send back everything the parent had counted before the fork
+    global _counters, _histograms, _lock
+    _counters, _histograms = {}, {}
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def drain() -> dict | None:
+    """ Inside a pool worker: what was collected since the last drain, to send back with the task result.
+    None in the main process, whose metrics are already where /metrics reads them. """
+    if not ENABLED or mp.parent_process() is None:
+        return None
+    global _counters, _histograms
+    with _lock:
+        delta = {"counters": _counters, "histograms": _histograms}
+        _counters, _histograms = {}, {}
+    return delta
+
+
+def merge(delta: dict | None):
+    """ Add what a pool worker collected to this process """
+    if not delta:
+        return
+    with _lock:
+        for key, value in delta["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, (buckets, total, count) in delta["histograms"].items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+            histogram[2] += count
+
+
+def _labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(gauges: list = ()) -> str:
+    """ Everything collected so far in the Prometheus text format, plus `gauges`: (name, help, labels, value) """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+            continue
+        for (key_name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                bound_label = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(labels, bound_label)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    seen = set()
+    for name, help_text, labels, value in gauges:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
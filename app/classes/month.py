@@ -1,7 +1,9 @@
 import calendar
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 from datetime import date
 from enum import Enum
+from .fonts import FONT_PATH, FONT_PATH_BOLD, get_font, text_size
 
 class DayType(Enum):
     NONE = 0
@@ -20,7 +22,7 @@ class Day:
 
 
 class CalMonth:
-    def __init__(self, year, month, font: ImageFont, small_font: ImageFont, small_font_bold: ImageFont):
+    def __init__(self, year, month, font: ImageFont = None, small_font: ImageFont = None, small_font_bold: ImageFont = None):
         self.day_colors = {}  # Format: {day: color, ...}
         self.day_bgcolors = {}  # Format: {day: bgcolor, ...}
         self.note = ""
@@ -28,9 +30,10 @@ class CalMonth:
         self.cal = calendar.monthcalendar(year,month)
         self.month = month
         self.year = year
-        self.font = font
-        self.small_font = small_font
-        self.small_font_bold = small_font_bold
+        # Fall back to the shared fonts CalYear uses
+        self.font = font or get_font(FONT_PATH_BOLD, 22)
+        self.small_font = small_font or get_font(FONT_PATH, 18)
+        self.small_font_bold = small_font_bold or get_font(FONT_PATH_BOLD, 18)
         self.aspect_ratio = 320 / 300
         self.day_bold = []
         self.day_bold_outline = []
@@ -83,10 +86,12 @@ class CalMonth:
         return months_abbr[self.month]
 
     def _get_text_dimensions(self, draw, text, font):
-        bbox = draw.textbbox((0, 0), text, font=font)
-        return bbox[2] - bbox[0], bbox[3] - bbox[1]
+        return text_size(font, text)
+
+    def draw(self, width, use_template: bool = False):
+        if use_template:
+            return self.draw_from_template(width)
 
-    def draw(self, width):
         image_height = int(width / self.aspect_ratio) 
         scaled_height = 50 * (image_height / 200)
     
@@ -96,8 +101,7 @@ class CalMonth:
         draw = ImageDraw.Draw(img)
 
         title = self.get_title()
-        title_bbox = draw.textbbox((0, 0), title, font=self.font)
-        title_w = title_bbox[2] - title_bbox[0]
+        title_w, _ = text_size(self.font, title)
         #title_h = title_bbox[3] - title_bbox[1]
         title_coords = ((width - title_w) / 2 - 15, 5 * image_height / 200)
         draw.text(title_coords, title, font=self.font, fill="dimgray")
@@ -115,37 +119,111 @@ class CalMonth:
 
         for row_idx, rh in enumerate(row_height_values):
             for col_idx, day in enumerate(self.cal[row_idx] if row_idx < len(self.cal) else [0] * 7):
-                day_color = self.day_colors.get(day, "red" if col_idx in [0, 6] else "black")
-                bgcolor = self.day_bgcolors.get(day, "white")
-                
                 if row_idx == 6:
                     bottom_edge = image_height - 1
                 else:
                     bottom_edge = row_height_values[row_idx + 1] - 1
-                rect_coords = [col_width_values[col_idx] + 1, rh + 1, col_width_values[col_idx + 1] - 1, bottom_edge]
+                rect_coords = (col_width_values[col_idx] + 1, rh + 1, col_width_values[col_idx + 1] - 1, bottom_edge)
                 
-                if day:
-                    font = self.small_font
-                    if day in self.day_bold:
-                        font = self.small_font_bold
-                    text_bbox = draw.textbbox((col_width_values[col_idx], rh), str(day), font=font)
-                    text_w, text_h = text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]
-
-                    x_text = col_width_values[col_idx] + (col_width - text_w) / 2
-                    y_text = rh + (row_height - text_h) / 2 - 5
-                    draw.rectangle(rect_coords, fill=bgcolor)
-                    draw.text((x_text, y_text), str(day), font=font, fill=day_color)
                 if row_idx < 6:
-                    width = 1
-                    if day in self.day_bold_outline:
-                        width = 4
-                    draw.rectangle(rect_coords, width=width, outline="black")
+                    day_color, bgcolor, font, outline_width = self._cell_style(day, col_idx)
+                    _draw_cell(draw, rect_coords, col_width_values[col_idx], rh, col_width, row_height, day, font, day_color, bgcolor, outline_width)
                 else:
                     # day_bbox = draw.textbbox((col_idx * col_width, scaled_height + row_idx * row_height), "summer = 22", font=small_font)
                     draw.rectangle([(1, scaled_height + 6 * row_height + 1), (7*col_width-1, scaled_height + 7 * row_height-1)], width=1, outline="black")
-                    text_bbox = draw.textbbox(rect_coords, self.note, font=self.small_font)
-                    text_w = text_bbox[2] - text_bbox[0]
-                    text_h = text_bbox[3] - text_bbox[1]
-                    draw.text((2*(col_width), scaled_height + row_idx * row_height+(0.5*text_h)), self.note, font=self.small_font, fill="black")
+                    self._draw_note(draw, col_width, scaled_height, row_height)
+        return img
+        #img.save('calendar.png')
+
+    def draw_from_template(self, width):
+        """ Same image as draw(), built from a cached blank grid of this month.
+        Only the days whose colors, font or outline differ from the blank grid are repainted. """
+        img = _blank_month(self.year, self.month, width, self.font, self.small_font, self.small_font_bold).copy()
+        image_height = img.height
+        scaled_height = 50 * (image_height / 200)
+        col_width = width / 8
+        col_width_values = [idx * col_width for idx in range(8)]
+        row_height = (image_height - scaled_height) / 7
+        row_height_values = [scaled_height + row_idx * row_height for row_idx in range(7)]
+
+        for row_idx, week in enumerate(self.cal[:6]):
+            rh = row_height_values[row_idx]
+            for col_idx, day in enumerate(week):
+                if not day:
+                    continue
+                day_color, bgcolor, font, outline_width = self._cell_style(day, col_idx)
+                if bgcolor == "white" and outline_width == 1 and font is self.small_font and day not in self.day_colors:
+                    # identical to the blank grid
+                    continue
+                rect_coords = (col_width_values[col_idx] + 1, rh + 1, col_width_values[col_idx + 1] - 1, row_height_values[row_idx + 1] - 1)
+                tile, box = _cell_tile(rect_coords, col_width_values[col_idx], rh, col_width, row_height, day, font, day_color, bgcolor, outline_width)
+                img.paste(tile, box)
+
+        if self.note:
+            tile, box = _note_tile(self.note, self.small_font, col_width, scaled_height, row_height)
+            img.paste(tile, box)
         return img
-        #img.save('calendar.png')
\ No newline at end of file
+
+    def _cell_style(self, day: int, col_idx: int) -> tuple:
+        """ Text color, background color, font and outline width of a day cell """
+        day_color = self.day_colors.get(day, "red" if col_idx in [0, 6] else "black")
+        bgcolor = self.day_bgcolors.get(day, "white")
+        font = self.small_font
+        if day in self.day_bold:
+            font = self.small_font_bold
+        outline_width = 1
+        if day in self.day_bold_outline:
+            outline_width = 4
+        return day_color, bgcolor, font, outline_width
+
+    def _draw_note(self, draw, col_width, scaled_height, row_height):
+        _draw_note(draw, self.note, self.small_font, col_width, scaled_height, row_height)
+
+
+def _draw_note(draw, note, font, col_width, scaled_height, row_height, origin=(0, 0)):
+    text_w, text_h = text_size(font, note)
+    draw.text((2*(col_width) - origin[0], scaled_height + 6 * row_height+(0.5*text_h) - origin[1]), note, font=font, fill="black")
+
+
+def _draw_cell(draw, rect_coords, x, y, col_width, row_height, day, font, day_color, bgcolor, outline_width, origin=(0, 0)):
+    """ Paint one day cell. origin shifts every coordinate, for drawing onto a cropped tile """
+    ox, oy = origin
+    rect_coords = [rect_coords[0] - ox, rect_coords[1] - oy, rect_coords[2] - ox, rect_coords[3] - oy]
+    if day:
+        text_w, text_h = text_size(font, str(day))
+
+        x_text = x + (col_width - text_w) / 2
+        y_text = y + (row_height - text_h) / 2 - 5
+        draw.rectangle(rect_coords, fill=bgcolor)
+        draw.text((x_text - ox, y_text - oy), str(day), font=font, fill=day_color)
+    draw.rectangle(rect_coords, width=outline_width, outline="black")
+
+
+@lru_cache(maxsize=128)
+def _blank_month(year, month, width, font, small_font, small_font_bold) -> Image:
+    """ Month grid with title, weekday headers and uncolored day numbers, shared between candidates """
+    return CalMonth(year, month, font, small_font, small_font_bold).draw(width)
+
+
+@lru_cache(maxsize=4096)
+def _cell_tile(rect_coords, x, y, col_width, row_height, day, font, day_color, bgcolor, outline_width) -> tuple:
+    """ A painted day cell cropped to the pixels its rectangle covers, and the box to paste it at.
+    PIL truncates rectangle coordinates, so drawing at an integer offset gives the same pixels. """
+    left, top = int(rect_coords[0]), int(rect_coords[1])
+    box = (left, top, int(rect_coords[2]) + 1, int(rect_coords[3]) + 1)
+    tile = Image.new('RGB', (box[2] - left, box[3] - top), 'white')
+    _draw_cell(ImageDraw.Draw(tile), rect_coords, x, y, col_width, row_height, day, font, day_color, bgcolor, outline_width, origin=(left, top))
+    return tile, box
+
+
+@lru_cache(maxsize=1024)
+def _note_tile(note, font, col_width, scaled_height, row_height) -> tuple:
+    """ The inside of the note box with the note painted, and the box to paste it at.
+    draw() paints the note once per column of the last row, so it is painted 7 times here as well. """
+    left, top = 2, int(scaled_height + 6 * row_height + 1) + 1
+    box = (left, top, int(7*col_width-1), int(scaled_height + 7 * row_height-1))
+    tile = Image.new('RGB', (box[2] - left, box[3] - top), 'white')
+    draw = ImageDraw.Draw(tile)
+    for _ in range(7):
+        _draw_note(draw, note, font, col_width, scaled_height, row_height, origin=(left, top))
+    return tile, box
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from . import metrics
+
+# File extension for each kind of artifact kept per schedule
+KINDS = {"png": ".png", "thumb": ".thumb.png", "xlsx": ".xlsx", "data": ".json", "sweep": ".sweep.json"}
+
+_HASH_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Seconds after which a process measures the cache directory again, to count what the other processes wrote
+RESCAN_INTERVAL = 30
+
+# Shared memory filesystem of the host, mapped into every process that reads from it
+SHM_ROOT = "/dev/shm"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class RenderCache:
+    """ Rendered calendars on disk, keyed by the schedule hash (CalYear.dict_hash).
+    Every schedule gets one file per kind under <root>/<first two hash chars>/.
+    Reads refresh a file's mtime and writes evict the least recently used files once the
+    cache grows past max_bytes, so several processes can share one directory.
+    A cache can sit in front of a larger, slower `fallback` cache: misses are looked up there
+    and copied in, and writes go to both. """
+
+    def __init__(self, root: str, max_bytes: int, fallback=None, name: str = "disk"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fallback = fallback
+        self.name = name
+        self._size = None
+        self._scanned = 0
+        self._lock = threading.Lock()
+
+    def path(self, md5_hash: str, kind: str) -> str:
+        return os.path.join(self.root, md5_hash[:2], md5_hash + KINDS[kind])
+
+    def get(self, md5_hash: str, kind: str) -> bytes | None:
+        """ Cached bytes for a schedule, or None on a miss """
+        if not md5_hash or not _HASH_RE.match(md5_hash):
+            return None
+        data = self._read(md5_hash, kind)
+        metrics.inc("calendar_cache_requests_total", tier=self.name, kind=kind, result="miss" if data is None else "hit")
+        if data is None and self.fallback is not None:
+            data = self.fallback.get(md5_hash, kind)
+            if data is not None:
+                self._write(md5_hash, kind, data)
+        return data
+
+    def _read(self, md5_hash: str, kind: str) -> bytes | None:
+        path = self.path(md5_hash, kind)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            # mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def has(self, md5_hash: str, kind: str) -> bool:
+        if not md5_hash or not _HASH_RE.match(md5_hash):
+            return False
+        if os.path.exists(self.path(md5_hash, kind)):
+            return True
+        return self.fallback is not None and self.fallback.has(md5_hash, kind)
+
+    def put(self, md5_hash: str, kind: str, data: bytes):
+        if not md5_hash or not _HASH_RE.match(md5_hash):
+            return
+        self._write(md5_hash, kind, data)
+        if self.fallback is not None:
+            self.fallback.put(md5_hash, kind, data)
+
+    def _write(self, md5_hash: str, kind: str, data: bytes):
+        path = self.path(md5_hash, kind)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temporary file first so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only an optimization, a full or read-only disk must not fail the request
+            return
+        with self._lock:
+            if self._size is None or time.monotonic() - self._scanned > RESCAN_INTERVAL:
+                # other processes write to the same directory, so measure it again from time to time
+                self._size = sum(size for _, size, _ in self._entries())
+                self._scanned = time.monotonic()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_json(self, md5_hash: str, kind: str = "data") -> dict | None:
+        data = self.get(md5_hash, kind)
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def put_json(self, md5_hash: str, value: dict, kind: str = "data"):
+        self.put(md5_hash, kind, json.dumps(value).encode())
+
+    def _entries(self) -> list:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """ Delete the least recently used files until the cache is back under 90% of max_bytes """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+
+def _megabytes(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+def get_render_cache() -> RenderCache | None:
+    """ Process-wide render cache, configured by CALENDAR_CACHE_DIR and CALENDAR_CACHE_MAX_MB (0 disables it).
+    Where the host has a shared memory filesystem, a CALENDAR_SHM_CACHE_MB tier there (0 disables only that tier) sits in front,
+    so every worker process on the host reads recent calendars straight from memory. """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = _megabytes("CALENDAR_CACHE_MAX_MB", 256)
+            if max_mb <= 0:
+                return None
+            root = os.environ.get("CALENDAR_CACHE_DIR") or "render_cache"
+            cache = RenderCache(root, int(max_mb * 1024 * 1024))
+            shm_mb = _megabytes("CALENDAR_SHM_CACHE_MB", 32)
+            if shm_mb > 0 and os.path.isdir(SHM_ROOT) and os.access(SHM_ROOT, os.W_OK):
+                root = os.path.join(SHM_ROOT, f"academic_calendar_cache_{os.getuid()}")
+                cache = RenderCache(root, int(shm_mb * 1024 * 1024), fallback=cache, name="shm")
+            _cache = cache
+        return _cache
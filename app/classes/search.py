@@ -0,0 +1,734 @@
+import base64
+import io
+import itertools
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from datetime import date, timedelta
+from PIL import Image
+from .year import CalYear, Calendar_Input
+from .render_cache import get_render_cache
+from .memo import get_sweep_memo, input_digest
+from .excel import sweep_workbook
+from . import metrics
+
+# Parameter grid swept by /calendar/build_years
+AWD_RANGE = range(170, 181)
+ID_RANGE = range(145, 150)
+CONVOCATION_RANGE = range(2, 6)
+WINTER_RANGE = range(12, 16)
+
+# Candidates per worker handed to the pool at once by a sweep that can be cancelled
+CANCEL_SLICE = 16
+
+# Width and palette size of the thumbnails kept next to every drawn calendar
+THUMBNAIL_WIDTH = 440
+THUMBNAIL_COLORS = 64
+
+# The web process already runs threads (request executor, log writer) when the pool starts, and a worker forked
+# straight from it could hang on a lock one of them held. Workers are forked from a single-threaded server process instead.
+_pool_context = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    """ Number of worker processes, read from CALENDAR_WORKERS (defaults to the usable CPU count) """
+    value = os.environ.get("CALENDAR_WORKERS")
+    if value:
+        try:
+            return max(1, int(value))
+        except ValueError:
+            pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_pool(workers: int):
+    """ Return the shared process pool, or None when the sweep should run serially """
+    global _pool, _pool_size
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is not None and _pool_size == workers:
+            return _pool
+        if _pool is not None:
+            _pool.terminate()
+            _pool = None
+        try:
+            _pool = _pool_context.Pool(workers)
+        except (OSError, ValueError, AssertionError):
+            # No process support here (sandbox, daemonic parent, ...), fall back to serial mode
+            _pool = None
+            return None
+        _pool_size = workers
+        return _pool
+
+
+def shutdown_pool():
+    """ Terminate the shared process pool, if one was started """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+
+
+def parameter_grid() -> list:
+    """ All (awd, id, convo_day, winter_sess) tuples, in the order the sweep reports them """
+    return list(itertools.product(AWD_RANGE, ID_RANGE, CONVOCATION_RANGE, WINTER_RANGE))
+
+
+class StagedEvaluator:
+    """ Evaluates sweep candidates for one input by forking shared calendar states instead of starting over.
+    Setup and spring break are the same for every candidate, winter session only depends on winter_sess,
+    and instructional days plus summer session on (id, convo_day, winter_sess). Each of those states is
+    computed once, then forked for the stages after it; only the AWD stage runs per candidate.
+    Candidates are pruned without running the AWD stage when a state they share has already failed, when
+    fewer instructional days already ended spring past May 31st, or when their AWD total is outside
+    the bounds the instructional days state allows. """
+
+    def __init__(self, req: Calendar_Input):
+        self.req = req
+        self._start = None
+        self._winter = {}
+        self._id = {}
+        self._awd_bounds = {}
+        # smallest id that ended spring too late, per (convo_day, winter_sess)
+        self._spring_limit = {}
+        # CalYear.failure of every state that failed, keyed like the states
+        self._failures = {}
+
+    def start_state(self) -> CalYear | None:
+        if self._start is None:
+            with metrics.timer("setup"):
+                calyear = CalYear(self.req)
+                if not calyear.valid:
+                    # compute_schedule does not check the start date window either
+                    calyear.setup_calendar()
+            self._start = calyear if calyear.run_stage("start", calyear.compute_start) else False
+            if not self._start:
+                self._failures["start"] = calyear.failure
+        return self._start or None
+
+    def winter_state(self, winter: int) -> CalYear | None:
+        if winter not in self._winter:
+            state = self.start_state()
+            if state is not None:
+                state = state.fork()
+                if not state.run_stage("winter", state.compute_winter_session, winter):
+                    self._failures[winter] = state.failure
+                    state = None
+            self._winter[winter] = state
+        return self._winter[winter]
+
+    def id_state(self, id_days: int, convocation: int, winter: int) -> CalYear | None:
+        key = (id_days, convocation, winter)
+        if key not in self._id:
+            state = self.winter_state(winter)
+            limit = self._spring_limit.get((convocation, winter))
+            if state is not None and limit is not None and id_days >= limit:
+                # more instructional days only push the end of spring further out
+                self._failures[key] = "spring_past_may"
+                metrics.inc("calendar_rule_failures_total", reason="spring_past_may")
+                state = None
+            elif state is not None:
+                state = state.fork()
+                if state.run_stage("id", state.compute_id, id_days, convocation) and state.run_stage("summer", state.compute_summer_session):
+                    self._awd_bounds[key] = state.awd_bounds()
+                else:
+                    if state.failure == "spring_past_may":
+                        self._spring_limit[(convocation, winter)] = min(id_days, limit or id_days)
+                    self._failures[key] = state.failure
+                    state = None
+            self._id[key] = state
+        return self._id[key]
+
+    def compute(self, params: tuple, convocation_day: date = None) -> tuple:
+        """ Same as CalYear.compute_schedule(*params): the hash and the finished calendar, or None and None """
+        awd, id_days, convocation, winter = params
+        state = self.id_state(id_days, convocation, winter)
+        if state is None:
+            return None, None
+        calyear = state.fork()
+        calyear.params = params
+        return calyear.compute_finish(awd, convocation_day), calyear
+
+    def _pruned(self, stage: str, reason: str, counted: bool) -> tuple:
+        # a failed state counts its reason once, when its stage runs; every other candidate it prunes counts it
+        # again, so calendar_rule_failures_total has one failure per candidate, like a sweep without pruning
+        if not counted:
+            metrics.inc("calendar_rule_failures_total", reason=reason)
+        return [], stage, reason
+
+    def evaluate(self, params: tuple) -> tuple:
+        """ (hash, convocation_day) schedules of a candidate: none if a rule fails, one per possible
+        convocation day with the "enumerate" policy, otherwise one.
+        Also returns the stage the candidate was pruned at, None if it went through the AWD stage,
+        and the CalYear.failure reason of a candidate without schedules, the same one
+        CalYear.compute_schedule gives when pruning skipped the stage that would have failed. """
+        awd, id_days, convocation, winter = params
+        key = (id_days, convocation, winter)
+        start_known, winter_known, id_known = self._start is not None, winter in self._winter, key in self._id
+        if self.start_state() is None:
+            return self._pruned("start", self._failures["start"], not start_known)
+        if self.winter_state(winter) is None:
+            return self._pruned("winter", self._failures[winter], not winter_known)
+        if self.id_state(*key) is None:
+            return self._pruned("id", self._failures[key], not id_known)
+        awd_min, awd_max = self._awd_bounds[key]
+        if awd < awd_min:
+            # ends before commencement
+            return self._pruned("awd", "awd_short", False)
+        if awd > awd_max:
+            return self._pruned("awd", "awd_into_summer", False)
+
+        md5_hash, calyear = self.compute(params)
+        if md5_hash is None:
+            return [], None, calyear.failure
+        schedules = [(md5_hash, calyear.convocation_day)]
+        if self.req.convocation_policy == "enumerate":
+            for convocation_day in calyear.convocation_options:
+                if convocation_day == schedules[0][1]:
+                    continue
+                md5_hash, _ = self.compute(params, convocation_day)
+                if md5_hash is not None:
+                    schedules.append((md5_hash, convocation_day))
+            schedules.sort(key=lambda schedule: schedule[1])
+        return schedules, None, None
+
+
+_evaluators = OrderedDict()
+_evaluators_lock = threading.Lock()
+
+
+def get_evaluator(req: Calendar_Input) -> StagedEvaluator:
+    """ StagedEvaluator for an input, kept for the last few inputs seen by this process """
+    key = input_digest(req)
+    with _evaluators_lock:
+        evaluator = _evaluators.get(key)
+        if evaluator is None:
+            evaluator = _evaluators[key] = StagedEvaluator(req)
+            while len(_evaluators) > 8:
+                _evaluators.popitem(last=False)
+        return evaluator
+
+
+def evaluate_candidate(task: tuple) -> tuple:
+    """ Run the scheduling rules for one candidate, without drawing anything.
+    Returns the candidate, its (hash, convocation_day) schedules, the stage it was pruned at,
+    why it has no schedule and the metrics collected by the worker """
+    req, params = task
+    schedules, pruned, failure = get_evaluator(req).evaluate(params)
+    return params, schedules, pruned, failure, metrics.drain()
+
+
+def render_candidate(task: tuple) -> tuple:
+    """ Replay a unique schedule and draw it. Runs inside a worker process, so the image is returned as PNG bytes,
+    full size and thumbnail, along with the schedule data kept next to it in the render cache
+    and the metrics collected by the worker """
+    req, params, convocation_day = task
+    calyear = CalYear(req)
+    calyear.compute_schedule(*params, convocation_day=convocation_day)
+    png, thumb = _encode(calyear.render_schedule())
+    return png, thumb, calyear.schedule_data(), metrics.drain()
+
+
+def _png(image: Image, **options) -> bytes:
+    img_bytes_io = io.BytesIO()
+    with metrics.timer("png_encode"):
+        image.save(img_bytes_io, format='PNG', **options)
+    return img_bytes_io.getvalue()
+
+
+def _thumbnail(image: Image) -> bytes:
+    # A calendar has only a handful of colors, a small palette keeps the thumbnail to a few dozen KB
+    height = round(image.height * THUMBNAIL_WIDTH / image.width)
+    with metrics.timer("thumbnail"):
+        small = image.convert("RGB").resize((THUMBNAIL_WIDTH, height), Image.LANCZOS).quantize(THUMBNAIL_COLORS)
+    return _png(small, optimize=True)
+
+
+def _encode(image: Image) -> tuple:
+    """ Full size and thumbnail PNG bytes of a drawn calendar """
+    return _png(image), _thumbnail(image)
+
+
+class _Done:
+    """ Stands in for an AsyncResult when the drawing is already available """
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self) -> bool:
+        return True
+
+    def get(self):
+        return self.value
+
+
+def _map(pool, workers: int, func, tasks: list):
+    if pool is None:
+        return map(func, tasks)
+    chunksize = max(1, len(tasks) // (workers * 4))
+    return pool.imap(func, tasks, chunksize)
+
+
+def _parameters(params: tuple, convocation_day: date) -> dict:
+    awd, id_days, convo_day, winter_sess = params
+    return {
+        "awd": awd,
+        "id": id_days,
+        "convo_day": convo_day,
+        "winter_sess": winter_sess,
+        "convocation_date": convocation_day.isoformat()
+    }
+
+
+def params_from(parameters: dict) -> tuple:
+    """ (awd, id, convo_day, winter_sess) tuple of a result's parameters """
+    return parameters["awd"], parameters["id"], parameters["convo_day"], parameters["winter_sess"]
+
+
+def _describe(req: Calendar_Input, md5_hash: str, params: tuple, convocation_day: date, data: dict) -> dict:
+    # everything needed to compute the schedule again, kept next to it in the render cache
+    data.update(hash=md5_hash, parameters=_parameters(params, convocation_day), inputs=req.model_dump())
+    return data
+
+
+def _store(cache, req: Calendar_Input, md5_hash: str, params: tuple, convocation_day: date, png: bytes, thumb: bytes, data: dict):
+    cache.put(md5_hash, "png", png)
+    cache.put(md5_hash, "thumb", thumb)
+    cache.put_json(md5_hash, _describe(req, md5_hash, params, convocation_day, data))
+
+
+def render_cached(req: Calendar_Input, calyear: CalYear, md5_hash: str, params: tuple) -> bytes:
+    """ PNG of the schedule calyear just computed, from the render cache when it has been drawn before """
+    cache = get_render_cache()
+    if cache is not None:
+        png = cache.get(md5_hash, "png")
+        if png is not None:
+            return png
+    png, thumb = _encode(calyear.render_schedule())
+    if cache is not None:
+        _store(cache, req, md5_hash, params, calyear.convocation_day, png, thumb, calyear.schedule_data())
+    return png
+
+
+def _cached_image(cache, md5_hash: str, size: str) -> bytes | None:
+    if size != "thumb":
+        return cache.get(md5_hash, "png")
+    thumb = cache.get(md5_hash, "thumb")
+    if thumb is None:
+        png = cache.get(md5_hash, "png")
+        if png is not None:
+            # drawn before thumbnails were kept, shrink the full image instead of drawing it again
+            thumb = _thumbnail(Image.open(io.BytesIO(png)))
+            cache.put(md5_hash, "thumb", thumb)
+    return thumb
+
+
+def _finish(cache, req: Calendar_Input, md5_hash: str, params: tuple, convocation_day: date, rendered: tuple,
+            raw: bool, size: str) -> dict:
+    png, thumb, data, worker_metrics = rendered
+    metrics.merge(worker_metrics)
+    if cache is not None and data is not None:
+        # freshly drawn, keep it for later requests
+        _store(cache, req, md5_hash, params, convocation_day, png, thumb, data)
+    image = thumb if size == "thumb" else png
+    if not raw:
+        with metrics.timer("base64"):
+            image = base64.b64encode(image).decode("utf-8")
+    return {
+        "image": image,
+        "parameters": _parameters(params, convocation_day),
+        "hash": md5_hash
+    }
+
+
+# Sweep counts kept with a memoized sweep
+SWEEP_COUNTS = ("candidates", "valid", "unique", "evaluated", "pruned", "failures")
+
+
+def _sweep_stats() -> dict:
+    # failures counts the candidates without any schedule by CalYear.failure reason
+    return dict(candidates=0, valid=0, unique=0, evaluated=0, pruned={"start": 0, "winter": 0, "id": 0, "awd": 0}, failures={})
+
+
+def _record(stats: dict, seen: set, result: tuple) -> list:
+    """ Count one evaluated candidate and return its (hash, params, convocation_day) schedules not seen before """
+    params, schedules, pruned, failure, worker_metrics = result
+    metrics.merge(worker_metrics)
+    metrics.inc("calendar_candidates_total", pruned=pruned or "none")
+    stats["candidates"] += 1
+    if pruned is not None:
+        stats["pruned"][pruned] += 1
+    else:
+        stats["evaluated"] += 1
+    if failure is not None:
+        stats["failures"][failure] = stats["failures"].get(failure, 0) + 1
+    new = []
+    for md5_hash, convocation_day in schedules:
+        stats["valid"] += 1
+        if md5_hash in seen:
+            metrics.inc("calendar_schedules_total", result="duplicate")
+            continue
+        seen.add(md5_hash)
+        stats["unique"] += 1
+        metrics.inc("calendar_schedules_total", result="unique")
+        new.append((md5_hash, params, convocation_day))
+    return new
+
+
+def _memoizable(req: Calendar_Input) -> bool:
+    # the "random" policy promises a new convocation pick on every request, so its sweeps are never replayed
+    return req.convocation_policy != "random"
+
+
+def _recall(req: Calendar_Input) -> dict | None:
+    """ Memoized sweep of an input, from this process's memo or else from the render cache,
+    which every worker process on the host shares """
+    memo = get_sweep_memo()
+    if memo is None or not _memoizable(req):
+        return None
+    memo_key = input_digest(req)
+    memoized = memo.get(memo_key)
+    if memoized is None:
+        cache = get_render_cache()
+        shared = cache.get_json(memo_key, "sweep") if cache is not None else None
+        if shared is not None and shared["expires"] > time.time():
+            schedules = [(md5_hash, tuple(params), date.fromisoformat(day)) for md5_hash, params, day in shared["schedules"]]
+            memoized = {"schedules": schedules, "stats": shared["stats"]}
+            memo.put(memo_key, memoized)
+            metrics.inc("calendar_sweep_memo_requests_total", result="shared")
+        else:
+            metrics.inc("calendar_sweep_memo_requests_total", result="miss")
+    else:
+        metrics.inc("calendar_sweep_memo_requests_total", result="hit")
+    return memoized
+
+
+def _remember(req: Calendar_Input, found: list, stats: dict):
+    memo = get_sweep_memo()
+    if memo is None or not _memoizable(req):
+        return
+    memo_key = input_digest(req)
+    memoized = {"schedules": found, "stats": {key: stats[key] for key in SWEEP_COUNTS}}
+    memo.put(memo_key, memoized)
+    cache = get_render_cache()
+    if cache is not None:
+        # the input digest has the same form as a schedule hash, so the sweep sits next to the calendars
+        cache.put_json(memo_key, {
+            "schedules": [[md5_hash, list(params), day.isoformat()] for md5_hash, params, day in found],
+            "stats": memoized["stats"],
+            "expires": time.time() + memo.ttl
+        }, kind="sweep")
+
+
+def _unique_schedules(req: Calendar_Input, pool, workers: int, stats: dict, cancelled: threading.Event = None):
+    """ Evaluate the whole grid and yield (hash, params, convocation_day) for the first candidate of each schedule.
+    With a `cancelled` event the grid goes to the pool CANCEL_SLICE candidates per worker at a time,
+    and the search stops as soon as the event is set """
+    seen = set()
+    tasks = [(req, params) for params in parameter_grid()]
+    step = len(tasks) if cancelled is None else workers * CANCEL_SLICE
+    for start in range(0, len(tasks), step):
+        for result in _map(pool, workers, evaluate_candidate, tasks[start:start + step]):
+            if cancelled is not None and cancelled.is_set():
+                return
+            yield from _record(stats, seen, result)
+
+
+def iter_years(req: Calendar_Input, workers: int = None, stats: dict = None, raw: bool = False, size: str = "full",
+               cancelled: threading.Event = None):
+    """ Sweep the parameter grid and yield every unique calendar, in grid order, as soon as it is drawn.
+    A schedule is sent to the renderer the moment its hash is first seen, so drawing overlaps the search,
+    and schedules already in the render cache are not drawn at all. A sweep repeated with the same inputs
+    skips the search and replays the memoized schedules.
+    At most a few images are held at once; `stats` (if given) is filled with the sweep counts.
+    Images are base64 strings, or PNG bytes with raw=True, and THUMBNAIL_WIDTH wide with size="thumb".
+    Setting `cancelled` stops the search and the drawing, nothing more is yielded after that. """
+    if workers is None:
+        workers = default_workers()
+    pool = get_pool(workers)
+    cache = get_render_cache()
+    if stats is None:
+        stats = {}
+
+    memoized = _recall(req)
+    if memoized is not None:
+        stats.update(memoized["stats"], cached=0, memoized=True)
+        schedules = iter(memoized["schedules"])
+    else:
+        stats.update(_sweep_stats(), cached=0, memoized=False)
+        schedules = _unique_schedules(req, pool, workers, stats, cancelled)
+
+    found = []
+    pending = deque()
+    max_pending = 2 * workers
+    for md5_hash, params, convocation_day in schedules:
+        if cancelled is not None and cancelled.is_set():
+            return
+        found.append((md5_hash, params, convocation_day))
+        image = _cached_image(cache, md5_hash, size) if cache is not None else None
+        render_task = (req, params, convocation_day)
+        if image is not None:
+            stats["cached"] += 1
+            job = _Done((image, image, None, None))
+        elif pool is None:
+            job = _Done(render_candidate(render_task))
+        else:
+            job = pool.apply_async(render_candidate, (render_task,))
+        pending.append((md5_hash, params, convocation_day, job))
+        # Hand back finished drawings in order, and wait on the oldest when too many are in flight
+        while pending and (pending[0][3].ready() or len(pending) > max_pending):
+            md5_hash, params, convocation_day, job = pending.popleft()
+            yield _finish(cache, req, md5_hash, params, convocation_day, job.get(), raw, size)
+
+    while pending:
+        if cancelled is not None and cancelled.is_set():
+            return
+        md5_hash, params, convocation_day, job = pending.popleft()
+        yield _finish(cache, req, md5_hash, params, convocation_day, job.get(), raw, size)
+
+    if cancelled is not None and cancelled.is_set():
+        # the search was cut short
+        return
+    # Only complete sweeps are memoized, a stream the client dropped half way is not
+    if memoized is None:
+        _remember(req, found, stats)
+
+
+def sweep(req: Calendar_Input, workers: int = None, stats: dict = None) -> list:
+    """ Unique (hash, params, convocation_day) schedules of an input in grid order, from the sweep memo when possible """
+    if workers is None:
+        workers = default_workers()
+    if stats is None:
+        stats = {}
+
+    memoized = _recall(req)
+    if memoized is not None:
+        stats.update(memoized["stats"], memoized=True)
+        return list(memoized["schedules"])
+
+    stats.update(_sweep_stats(), memoized=False)
+    found = list(_unique_schedules(req, get_pool(workers), workers, stats))
+    _remember(req, found, stats)
+    return found
+
+
+def build_years_data(req: Calendar_Input, workers: int = None, stats: dict = None) -> list:
+    """ Every unique schedule of the sweep as structured data (CalYear.schedule_data), nothing is drawn """
+    cache = get_render_cache()
+    evaluator = get_evaluator(req)
+    results = []
+    for md5_hash, params, convocation_day in sweep(req, workers, stats):
+        # replaying from the shared stage states only runs the AWD stage
+        _, calyear = evaluator.compute(params, convocation_day)
+        data = calyear.schedule_data()
+        if cache is not None and not cache.has(md5_hash, "data"):
+            # kept for build_years_workbook
+            cache.put_json(md5_hash, _describe(req, md5_hash, params, convocation_day, dict(data)))
+        results.append({
+            "parameters": _parameters(params, convocation_day),
+            "hash": md5_hash,
+            "schedule": data
+        })
+    return results
+
+
+def build_years_workbook(md5_hashes: list) -> tuple:
+    """ Excel workbook with a summary sheet and one sheet per schedule, in the order of `md5_hashes`.
+    Every sheet is rebuilt from the schedule data the sweep left in the render cache: the solver does not run
+    and nothing is drawn, so the workbook holds exactly the options the client was shown.
+    Returns the workbook and an empty list, or None and the hashes whose data is not cached. """
+    cache = get_render_cache()
+    found = []
+    missing = []
+    for md5_hash in md5_hashes:
+        data = cache.get_json(md5_hash) if cache is not None else None
+        try:
+            calyear = CalYear(Calendar_Input(**data["inputs"]))
+            if not calyear.valid:
+                # as in StagedEvaluator.start_state, the sweep does not check the start date window
+                calyear.setup_calendar()
+            calyear.load_schedule_data(data)
+            found.append((md5_hash, data["parameters"], calyear))
+        except (KeyError, TypeError, ValueError):
+            # not cached (or evicted), or written by a version that kept less
+            missing.append(md5_hash)
+    if missing:
+        return None, missing
+    return sweep_workbook(found), []
+
+
+def recipe_token(req: Calendar_Input, params: tuple, convocation_day: date) -> str:
+    """ Input and parameters of a schedule packed into a URL-safe string, so its image URL can be
+    drawn again by any process, whatever the render cache still holds """
+    recipe = json.dumps({"inputs": req.model_dump(), "parameters": _parameters(params, convocation_day)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(zlib.compress(recipe.encode(), 9)).decode().rstrip("=")
+
+
+def _unpack_recipe(token: str) -> dict | None:
+    try:
+        return json.loads(zlib.decompress(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))))
+    except (ValueError, zlib.error):
+        return None
+
+
+def image_urls(req: Calendar_Input, md5_hash: str, params: tuple, convocation_day: date) -> dict:
+    """ Image and thumbnail URLs of a schedule, each carrying its recipe """
+    recipe = recipe_token(req, params, convocation_day)
+    return {
+        "image": f"/calendar/image/{md5_hash}?recipe={recipe}",
+        "thumbnail": f"/calendar/image/{md5_hash}?size=thumb&recipe={recipe}"
+    }
+
+
+def build_years_manifest(req: Calendar_Input, workers: int = None, stats: dict = None) -> list:
+    """ Hash, parameters and image URLs of every unique schedule of the sweep. Nothing is drawn here:
+    each URL carries the schedule's recipe, and /calendar/image/{hash} draws the image when it is not cached """
+    cache = get_render_cache()
+    evaluator = get_evaluator(req)
+    manifest = []
+    for md5_hash, params, convocation_day in sweep(req, workers, stats):
+        if cache is not None and not cache.has(md5_hash, "data"):
+            _, calyear = evaluator.compute(params, convocation_day)
+            cache.put_json(md5_hash, _describe(req, md5_hash, params, convocation_day, calyear.schedule_data()))
+        manifest.append({
+            "parameters": _parameters(params, convocation_day),
+            "hash": md5_hash,
+            **image_urls(req, md5_hash, params, convocation_day)
+        })
+    return manifest
+
+
+def image_for_hash(md5_hash: str, size: str = "full", recipe: str = None) -> bytes | None:
+    """ PNG (or thumbnail, with size="thumb") of a schedule: from the render cache, else drawn again from its cached
+    schedule data or from the `recipe` of its image URL. None when neither is known or they do not give this hash """
+    cache = get_render_cache()
+    data = None
+    if cache is not None:
+        image = _cached_image(cache, md5_hash, size)
+        if image is not None:
+            return image
+        data = cache.get_json(md5_hash)
+    if data is None and recipe:
+        data = _unpack_recipe(recipe)
+    if not isinstance(data, dict) or not data.get("parameters", {}).get("convocation_date"):
+        return None
+    try:
+        req = Calendar_Input(**data["inputs"])
+        params = params_from(data["parameters"])
+        convocation_day = date.fromisoformat(data["parameters"]["convocation_date"])
+    except (KeyError, TypeError, ValueError):
+        # a recipe that was cut short or edited
+        return None
+    calyear = CalYear(req)
+    # the recipe is only trusted when it computes the very schedule that was asked for
+    if calyear.compute_schedule(*params, convocation_day=convocation_day) != md5_hash:
+        return None
+    if cache is None:
+        image = calyear.render_schedule()
+        return _thumbnail(image) if size == "thumb" else _png(image)
+    png = render_cached(req, calyear, md5_hash, params)
+    if size != "thumb":
+        return png
+    return _cached_image(cache, md5_hash, "thumb") or _thumbnail(Image.open(io.BytesIO(png)))
+
+
+class _ChunkWriter:
+    """ Write-only file for zipfile that hands back everything written since the last take() """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(req: Calendar_Input, workers: int = None):
+    """ The sweep as a ZIP archive of raw PNGs, yielded piece by piece as calendars are drawn.
+    manifest.json, written last, lists each file with its hash and parameters, plus the sweep counts. """
+    out = _ChunkWriter()
+    stats = {}
+    manifest = []
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for number, result in enumerate(iter_years(req, workers, stats, raw=True), start=1):
+            filename = f"{number:03d}_{result['hash']}.png"
+            # PNGs are already compressed, store them as they are
+            archive.writestr(filename, result["image"])
+            manifest.append({"file": filename, "hash": result["hash"], "parameters": result["parameters"]})
+            yield out.take()
+        archive.writestr("manifest.json", json.dumps({"calendars": manifest, "summary": stats}, indent=1))
+    yield out.take()
+
+
+def build_years(req: Calendar_Input, workers: int = None) -> list:
+    """ Sweep the parameter grid and return every unique calendar, in grid order """
+    return list(iter_years(req, workers))
+
+
+def start_date_inputs(template: Calendar_Input, first_day: date, last_day: date) -> list:
+    """ Copies of template for every fall start date from first_day to last_day (inclusive) that CalYear accepts """
+    reqs = []
+    day = first_day
+    while day <= last_day:
+        if date(day.year, 8, 15) <= day < date(day.year, 9, 1):
+            reqs.append(template.model_copy(update={"year": day.year, "month": day.month, "day": day.day}))
+        day += timedelta(days=1)
+    return reqs
+
+
+def batch_sweeps(reqs: list, workers: int = None) -> list:
+    """ Unique schedules of several inputs, without drawing them.
+    The candidates of every input share one pass over the process pool, and finished sweeps are memoized
+    like build_years ones, so a later build_years for one of the inputs skips the search. """
+    if workers is None:
+        workers = default_workers()
+    pool = get_pool(workers)
+
+    sweeps = []
+    tasks = []
+    owners = []
+    for idx, req in enumerate(reqs):
+        memoized = _recall(req)
+        if memoized is not None:
+            sweeps.append((dict(memoized["stats"], memoized=True), list(memoized["schedules"])))
+            continue
+        sweeps.append((dict(_sweep_stats(), memoized=False), []))
+        for params in parameter_grid():
+            tasks.append((req, params))
+            owners.append(idx)
+
+    seen = {idx: set() for idx in owners}
+    for idx, result in zip(owners, _map(pool, workers, evaluate_candidate, tasks)):
+        stats, found = sweeps[idx]
+        found.extend(_record(stats, seen[idx], result))
+
+    summaries = []
+    for req, (stats, found) in zip(reqs, sweeps):
+        if not stats["memoized"]:
+            _remember(req, found, stats)
+        summaries.append({
+            "input": req.model_dump(),
+            "stats": stats,
+            "schedules": [{"hash": md5_hash, "parameters": _parameters(params, convocation_day)}
+                          for md5_hash, params, convocation_day in found]
+        })
+    return summaries
@@ -0,0 +1,109 @@
+import itertools
+from datetime import date
+from enum import Enum
+
+
+class DayStore:
+    """ Day types for a fixed window of consecutive dates, stored one byte per day.
+    Reads and writes take date objects like the dict it replaces; the *_at methods work on day offsets. """
+    UNSET = 0xFF
+
+    def __init__(self, origin: date, num_days: int, day_type: type[Enum], data: bytearray = None):
+        self.origin = origin
+        self.num_days = num_days
+        self.day_type = day_type
+        self._origin_ordinal = origin.toordinal()
+        self._origin_weekday = origin.weekday()
+        self._by_value = {member.value: member for member in day_type}
+        self.data = data if data is not None else bytearray([self.UNSET]) * num_days
+
+    def offset(self, the_date: date) -> int:
+        """ Day offset of a date from the start of the window """
+        off = the_date.toordinal() - self._origin_ordinal
+        if off < 0 or off >= self.num_days:
+            raise KeyError(the_date)
+        return off
+
+    def date_at(self, off: int) -> date:
+        return date.fromordinal(self._origin_ordinal + off)
+
+    def weekday_at(self, off: int) -> int:
+        """ Weekday of the day at an offset (0 = Monday, like date.weekday()) """
+        return (self._origin_weekday + off) % 7
+
+    def get_at(self, off: int):
+        value = self.data[off]
+        if value == self.UNSET:
+            return None
+        return self._by_value[value]
+
+    def set_at(self, off: int, day_type):
+        self.data[off] = day_type.value
+
+    def __getitem__(self, the_date: date):
+        value = self.data[self.offset(the_date)]
+        if value == self.UNSET:
+            raise KeyError(the_date)
+        return self._by_value[value]
+
+    def __setitem__(self, the_date: date, day_type):
+        self.data[self.offset(the_date)] = day_type.value
+
+    def __contains__(self, the_date) -> bool:
+        if not isinstance(the_date, date):
+            return False
+        off = the_date.toordinal() - self._origin_ordinal
+        return 0 <= off < self.num_days and self.data[off] != self.UNSET
+
+    def get(self, the_date: date, default=None):
+        if the_date in self:
+            return self[the_date]
+        return default
+
+    def keys(self):
+        return [self.date_at(off) for off, value in enumerate(self.data) if value != self.UNSET]
+
+    def items(self):
+        return [(self.date_at(off), self._by_value[value]) for off, value in enumerate(self.data) if value != self.UNSET]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return self.num_days - self.data.count(self.UNSET)
+
+    def fill(self, start: date, end: date, day_type):
+        """ Set every day in [start, end) to day_type """
+        lo, hi = self._bounds(start, end)
+        self.data[lo:hi] = bytes([day_type.value]) * (hi - lo)
+
+    def count(self, day_type, start: date = None, end: date = None, weekday: int = None) -> int:
+        """ Number of days of day_type in [start, end), optionally only on one weekday """
+        lo, hi = self._bounds(start, end)
+        if weekday is not None:
+            lo += (weekday - self.weekday_at(lo)) % 7
+            return self.data[lo:hi:7].count(day_type.value)
+        return self.data.count(day_type.value, lo, hi)
+
+    def runs(self) -> list:
+        """ Run-length encoding of the whole window: [day_type or None, number of days] pairs from origin on """
+        return [[self._by_value.get(value), len(list(group))] for value, group in itertools.groupby(self.data)]
+
+    @classmethod
+    def from_runs(cls, origin: date, runs: list, day_type: type[Enum]) -> "DayStore":
+        """ Store holding what runs() returned, with day types given by name """
+        data = bytearray()
+        for name, length in runs:
+            data += bytes([cls.UNSET if name is None else day_type[name].value]) * length
+        return cls(origin, len(data), day_type, data)
+
+    def copy(self) -> "DayStore":
+        return DayStore(self.origin, self.num_days, self.day_type, bytearray(self.data))
+
+    def tobytes(self) -> bytes:
+        return bytes(self.data)
+
+    def _bounds(self, start: date = None, end: date = None) -> tuple:
+        lo = 0 if start is None else start.toordinal() - self._origin_ordinal
+        hi = self.num_days if end is None else end.toordinal() - self._origin_ordinal
+        return max(lo, 0), min(hi, self.num_days)
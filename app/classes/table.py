@@ -0,0 +1,77 @@
+from functools import lru_cache
+from PIL import Image, ImageDraw
+from .fonts import FONT_PATH, get_font
+
+# Colors of plotly's default table template
+HEADER_FILL = "#C8D4E3"
+TEXT_COLOR = "#2a3f5f"
+
+
+def draw_table(header: list, columns: list, fill_colors: list, table_width: int = 550, height: int = 550,
+               cell_height: int = 40, font_size: int = 16, right_margin: int = 5, use_template: bool = False) -> Image:
+    """ Draw a table laid out like the plotly go.Table figures CalYear used to render through kaleido:
+    equal-width columns, a header row, one fill color per cell and 1px black grid lines.
+    use_template gives the same image from a cached table without values and cached value cells """
+    if use_template:
+        return _draw_from_template(header, columns, fill_colors, table_width, height, cell_height, font_size, right_margin)
+    font = get_font(FONT_PATH, font_size)
+    img = Image.new('RGB', (table_width, height), 'white')
+    draw = ImageDraw.Draw(img)
+
+    num_cols = len(header)
+    num_rows = max(len(column) for column in columns) + 1
+    xs = [int(idx * (table_width - right_margin) / num_cols) for idx in range(num_cols + 1)]
+    ys = [idx * cell_height for idx in range(num_rows + 1)]
+
+    # Cell backgrounds
+    for col_idx in range(num_cols):
+        draw.rectangle([xs[col_idx], ys[0], xs[col_idx + 1], ys[1]], fill=HEADER_FILL)
+        for row_idx in range(len(columns[col_idx])):
+            draw.rectangle([xs[col_idx], ys[row_idx + 1], xs[col_idx + 1], ys[row_idx + 2]], fill=fill_colors[col_idx][row_idx])
+
+    # Grid lines
+    for x in xs:
+        draw.line([(x, ys[0]), (x, ys[-1])], fill="black", width=1)
+    for y in ys:
+        draw.line([(xs[0], y), (xs[-1], y)], fill="black", width=1)
+
+    # Text, centered on the column with the baseline half way down the row
+    for col_idx in range(num_cols):
+        center = (xs[col_idx] + xs[col_idx + 1]) / 2
+        cells = [header[col_idx]] + list(columns[col_idx])
+        for row_idx, value in enumerate(cells):
+            draw.text((center, ys[row_idx] + cell_height / 2), str(value), font=font, fill=TEXT_COLOR, anchor="ms")
+    return img
+
+
+def _draw_from_template(header: list, columns: list, fill_colors: list, table_width: int, height: int,
+                        cell_height: int, font_size: int, right_margin: int) -> Image:
+    font = get_font(FONT_PATH, font_size)
+    # fill colors of the cells each column actually has, so the key only changes with the layout
+    fills = tuple(tuple(fill_colors[col_idx][:len(column)]) for col_idx, column in enumerate(columns))
+    img = _blank_table(tuple(header), fills, table_width, height, cell_height, font_size, right_margin).copy()
+
+    num_cols = len(header)
+    xs = [int(idx * (table_width - right_margin) / num_cols) for idx in range(num_cols + 1)]
+    for col_idx, column in enumerate(columns):
+        center = (xs[col_idx] + xs[col_idx + 1]) / 2
+        for row_idx, value in enumerate(column, start=1):
+            box = (xs[col_idx] + 1, row_idx * cell_height + 1, xs[col_idx + 1], (row_idx + 1) * cell_height)
+            img.paste(_value_tile(str(value), font, fills[col_idx][row_idx - 1], box, center, row_idx * cell_height + cell_height / 2), box[:2])
+    return img
+
+
+@lru_cache(maxsize=16)
+def _blank_table(header: tuple, fills: tuple, table_width: int, height: int, cell_height: int, font_size: int, right_margin: int) -> Image:
+    """ Backgrounds, grid lines and header of a table, shared by every table with the same layout """
+    return draw_table(list(header), [[""] * len(column) for column in fills], [list(column) for column in fills],
+                      table_width=table_width, height=height, cell_height=cell_height, font_size=font_size, right_margin=right_margin)
+
+
+@lru_cache(maxsize=1024)
+def _value_tile(text: str, font, fill: str, box: tuple, center: float, baseline: float) -> Image:
+    """ The inside of one value cell, between its grid lines, with its text drawn as draw_table places it """
+    left, top, right, bottom = box
+    tile = Image.new('RGB', (right - left, bottom - top), fill)
+    ImageDraw.Draw(tile).text((center - left, baseline - top), text, font=font, fill=TEXT_COLOR, anchor="ms")
+    return tile
@@ -1,20 +1,26 @@
 from pydantic import BaseModel
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from .month import DayType, Day, CalMonth
-import holidays
+from .store import DayStore
+from .holiday_index import HOLIDAY_LIST, get_holiday_index
+from .fonts import FONT_PATH, FONT_PATH_BOLD, get_font, prime_metrics
+from .table import draw_table
+from . import metrics
+from .logs import get_logger
+import os
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
-import plotly.graph_objects as go
 from io import BytesIO
 from enum import Enum
-from typing import Optional
+from typing import Optional, Literal
 import multiprocessing as mp
 import random
 from typing import Dict, Any
 import hashlib
+from functools import lru_cache
+import copy
 import json
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+import logging
 
 
 class Day(Enum):
@@ -43,6 +49,13 @@ class Calendar_Input(BaseModel):
     MLK_spring: bool
     
     width: Optional[int] = 350
+    # How the convocation day is picked when friday_convocation is off:
+    # "seeded" - pseudo-random, but always the same pick for the same seed and parameters
+    # "first" / "last" - the earliest / latest possible day
+    # "random" - unseeded, a new pick every time
+    # "enumerate" - build_years tries every possible day as one more search dimension
+    convocation_policy: Optional[Literal["seeded", "first", "last", "random", "enumerate"]] = "seeded"
+    convocation_seed: Optional[int] = 0
 
 class DayType(Enum):
     NONE = 0
@@ -57,8 +70,38 @@ class DayType(Enum):
     HOLIDAY = 9
     VOID = 10
 
+# Day types that count towards the Academic Work Days total
+AWD_DAY_TYPES = (DayType.ID, DayType.AWD, DayType.FINALS, DayType.CONVOCATION, DayType.COMMENCEMENT)
+
+# Months of days kept by the day store. The drawn calendar covers 13 months, but with a late fall start
+# summer session can run into September of the next year, past those 13 months
+STORE_MONTHS = 14
+
+# Key dates of a finished schedule, as kept by CalYear.schedule_data
+SCHEDULE_DATES = ("convocation_day", "fall_semester_start", "winter_session_start", "winter_session_end", "spring_semester_start",
+                  "commencement_start", "commencement_end", "summer_session_start", "summer_session_end")
+
+# What each CalYear.failure reason means
+FAILURE_MESSAGES = {
+    "start_window": "start date must be between August 15 and August 31",
+    "weekend_start": "cannot begin calendar on a weekend",
+    "awd_range": "AWD target outside 170 - 180",
+    "awd_into_summer": "AWD goes into summer session",
+    "awd_short": "not enough AWD to build calendar",
+    "spring_summer_gap": "gap between end of spring and start of summer",
+    "spring_friday_start": "spring cannot start on a Friday",
+    "id_range": "ID target outside 145 - 149",
+    "convocation_after_fall_start": "fall semester start day must be after convocation day",
+    "fall_not_monday": "fall semester start day must be a Monday",
+    "fall_uneven": "instructional days for fall are not equal",
+    "spring_past_may": "spring semester ended past May 31st",
+    "spring_uneven": "instructional days for spring are not equal",
+}
+
+log = get_logger("year")
+
 class CalYear:
-    def __init__(self, inputs : Calendar_Input, font_path = "fonts/OpenSans-Regular.ttf",font_path_bold = "fonts/OpenSans-Bold.ttf"):
+    def __init__(self, inputs : Calendar_Input, font_path = FONT_PATH, font_path_bold = FONT_PATH_BOLD, render_mode: str = "template", table_backend: str = None):
         self.legend_data = {
             "None": "#FFFFFF",
             "AWD": "#ccecff",
@@ -70,21 +113,27 @@ class CalYear:
             "Summer Session": "#c5e0b4",
             "Winter Session": "#cfcfcf"
         }
-        self.holiday_list = ['Martin Luther King Jr. Day', 'Labor Day', 'Thanksgiving', 'Day After Thanksgiving', 'New Year\'s Day', 'New Year\'s Day (Observed)', 'Independence Day', 'Independence Day (Observed)', 'Cesar Chavez Day', 'Cesar Chavez Day (Observed)', 'Veterans Day', 'Veterans Day (Observed)', 'Christmas Day', 'Christmas Day (Observed)', 'Memorial Day', 'Juneteenth National Independence Day']
+        self.holiday_list = HOLIDAY_LIST
         self.font_size = 22
         self.small_font_size = 18
-        self.font = ImageFont.truetype(font_path_bold, self.font_size)
-        self.small_font = ImageFont.truetype(font_path, self.small_font_size)
-        self.small_font_bold = ImageFont.truetype(font_path_bold, self.small_font_size)
+        # Fonts come from the process-wide registry, so they are only loaded once
+        self.font = get_font(font_path_bold, self.font_size)
+        self.small_font = get_font(font_path, self.small_font_size)
+        self.small_font_bold = get_font(font_path_bold, self.small_font_size)
         self.holiday_days : dict = {}
-        self.us_holidays = holidays.country_holidays('US') + holidays.country_holidays('US','CA') + holidays.country_holidays('US','VI')
         self.day_id_count: dict = {"fall": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0},
                                    "spring": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0}}
         self.day_awd_count: dict = {"fall": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0, Day.SATURDAY: 0},
                                    "spring": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0, Day.SATURDAY: 0}}
 
+        # "template" composites each month onto a cached blank grid, "full" redraws every month from scratch
+        self.render_mode = render_mode
+        # "pil" draws the summary tables natively, "plotly" renders them through kaleido (CALENDAR_TABLE_BACKEND)
+        self.table_backend = table_backend or os.environ.get("CALENDAR_TABLE_BACKEND", "pil")
         self.inputs = inputs
         self.start_date = date(inputs.year, inputs.month, inputs.day)
+        # Shared, read-only holiday lookups for this academic year
+        self.holiday_index = get_holiday_index(inputs.year)
         self.valid = True
         self.months = []
 
@@ -99,7 +148,10 @@ class CalYear:
     def reset(self):
         self.months = []
         self.month_stats : dict = {}
-        self.cal_dict : dict = {}
+        # One byte per day from the first of the start month
+        window_start = date(self.start_date.year, self.start_date.month, 1)
+        window_end = window_start + relativedelta(months=STORE_MONTHS)
+        self.cal_dict : DayStore = DayStore(window_start, (window_end - window_start).days, DayType)
         self.day_id_count: dict = {"fall": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0, Day.SATURDAY: 0},
                                    "spring": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0, Day.SATURDAY: 0}}
         self.day_awd_count: dict = {"fall": {Day.MONDAY: 0, Day.TUESDAY: 0, Day.WEDNESDAY: 0, Day.THURSDAY: 0, Day.FRIDAY: 0, Day.SATURDAY: 0},
@@ -109,11 +161,18 @@ class CalYear:
         self.spring_semester_start : date = None
         self.commencement_end : date = None
         self.summer_session_start : date = None
+        self.summer_session_end : date = None
         self.winter_session_start : date = None
         self.winter_session_end : date = None
         self.pre_fall_semester_start: date = None
         self.convocation_day: date = None
         self.commencement_start: date = None
+        self.awd_end: date = None
+        # Days compute_awd could pick as convocation, empty when it is fixed by friday_convocation
+        self.convocation_options: list[date] = []
+        self.params: tuple = None
+        # Short code of the rule that rejected the schedule, None while it holds
+        self.failure: str = None
         self.summer_session_id: int = 0
         self.winter_session_id: int = 0
         self.num_awd: int = 0
@@ -124,31 +183,133 @@ class CalYear:
             self.month_stats[cur_date] = {"ID": 0, "AWD": 0, "SUM": 0, "WIN": 0}
             cur_date = cur_date + relativedelta(months=1)
     
-    def gen_schedule(self, awd: int = 170, id: int = 145, convocation: int = 2, winter: int = 12) -> Image and str:
+    def gen_schedule(self, awd: int = 170, id: int = 145, convocation: int = 2, winter: int = 12, data_only: bool = False) -> Image and str:
+        """ Compute and draw a schedule, returns (image, hash). With data_only nothing is drawn, (schedule_data(), hash) is returned """
+        md5_hash = self.compute_schedule(awd, id, convocation, winter)
+        if md5_hash is None:
+            return None, None
+        if data_only:
+            return self.schedule_data(), md5_hash
+        return self.render_schedule(), md5_hash
+
+    def compute_schedule(self, awd: int = 170, id: int = 145, convocation: int = 2, winter: int = 12, convocation_day: date = None) -> str | None:
+        """ Run the scheduling rules and return the schedule hash, or None if a rule fails.
+        Pass convocation_day to replay a schedule whose convocation was already picked. """
         # 170 <= Acadmeic Work Days (AWD) <= 180
         # 145 <= Instructional Days (ID) <= 149
         # Avoid starting a semester on a Friday.
-        self.reset()  
-        self.setup_calendar()      
-        # clear current calendar list
-        current_calendar: list[CalMonth] = []
+        with metrics.timer("setup"):
+            self.reset()  
+            self.setup_calendar()      
+        self.params = (awd, id, convocation, winter)
         
+        # Compute Validity tests
+        if not self.run_stage("start", self.compute_start):
+            return None
+        if not self.run_stage("winter", self.compute_winter_session, winter):
+            return None
+        if not self.run_stage("id", self.compute_id, id, convocation):
+            return None
+        if not self.run_stage("summer", self.compute_summer_session):
+            return None
+        return self.compute_finish(awd, convocation_day)
+
+    def run_stage(self, stage: str, rules, *args) -> bool:
+        """ Run one group of scheduling rules under a stage timer, counting its failure reason if it fails """
+        with metrics.timer(stage):
+            ok = rules(*args)
+        if not ok:
+            metrics.inc("calendar_rule_failures_total", reason=self.failure or "unknown")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("rule failed: %s", FAILURE_MESSAGES.get(self.failure, self.failure),
+                          extra={"stage": stage, "reason": self.failure, "params": self.params})
+        return ok
+
+    def compute_start(self) -> bool:
+        """ Rules that do not depend on the sweep parameters: start date and spring break """
         # Test if start date is valid weekday and not on the weekend
         if is_weekend(self.start_date):
-            print("ERROR: cannot begin calendar on a weekend")
-            return None, None
-        # Compute Validity tests
-        if not self.compute_spring_break(combine_cc_day=self.inputs.cesar_chavez):
-            return None, None
-        if not self.compute_winter_session(winter):
-            return None, None
-        if not self.compute_id(id, convocation):
-            return None, None
-        if not self.compute_summer_session():
-            return None, None
-        if not self.compute_awd(awd):
-            return None, None
-            
+            self.failure = "weekend_start"
+            return False
+        return self.compute_spring_break(combine_cc_day=self.inputs.cesar_chavez)
+
+    def compute_finish(self, awd: int = 170, convocation_day: date = None) -> str | None:
+        """ Last stage of compute_schedule: Academic Work Days, then the counts and the hash """
+        if not self.run_stage("awd", self.compute_awd, awd, convocation_day):
+            return None
+        self.tally()
+        return self.dict_hash(self.cal_dict)
+
+    def awd_bounds(self) -> tuple:
+        """ Smallest and largest AWD totals compute_awd can reach from this state, both inclusive.
+        Only valid once summer session is computed. Fewer AWD end before commencement ("awd_short"),
+        more run into summer session ("awd_into_summer"). """
+        # every weekday before the first day of fall counts
+        before_fall = count_weekdays(self.start_date, self.fall_semester_start)
+        return (before_fall + self.count_awd_capacity(self.commencement_end) + 1,
+                before_fall + self.count_awd_capacity(self.summer_session_start))
+
+    def count_awd_capacity(self, end: date) -> int:
+        """ Days from the first day of fall up to end (excluded) that compute_awd would count as AWD """
+        store = self.cal_dict
+        start = self.fall_semester_start
+        total = sum(store.count(day_type, start, end) for day_type in AWD_DAY_TYPES)
+        return total + sum(store.count(DayType.NONE, start, end, weekday) for weekday in range(5))
+
+    def fork(self) -> "CalYear":
+        """ Copy of this calendar state for the next stages of a schedule, which leave this one untouched.
+        The CalMonth list and the holiday index are shared, they are not changed after setup. """
+        other = copy.copy(self)
+        other.cal_dict = self.cal_dict.copy()
+        other.month_stats = {month: dict(stats) for month, stats in self.month_stats.items()}
+        other.day_id_count = {season: dict(counts) for season, counts in self.day_id_count.items()}
+        other.day_awd_count = {season: dict(counts) for season, counts in self.day_awd_count.items()}
+        other.convocation_options = list(self.convocation_options)
+        return other
+
+    def tally(self):
+        """ Recount month_stats, day_id_count and day_awd_count from the calendar store """
+        store = self.cal_dict
+        for month_start, stats in self.month_stats.items():
+            month_end = month_start + relativedelta(months=1)
+            stats["ID"] = store.count(DayType.ID, month_start, month_end)
+            stats["AWD"] = self.count_awd_days(month_start, month_end)
+            stats["SUM"] = store.count(DayType.SUMMER_SESSION, month_start, month_end)
+            stats["WIN"] = store.count(DayType.WINTER_SESSION, month_start, month_end)
+
+        self.day_id_count["fall"] = self.count_id_days(self.fall_semester_start, self.spring_semester_start, self.day_id_count["fall"])
+        self.day_id_count["spring"] = self.count_id_days(self.spring_semester_start, self.awd_end, self.day_id_count["spring"])
+        for day in self.day_awd_count["fall"]:
+            self.day_awd_count["fall"][day] = self.count_awd_days(self.start_date, self.spring_semester_start, day.value)
+            self.day_awd_count["spring"][day] = self.count_awd_days(self.spring_semester_start, self.awd_end, day.value)
+
+    def count_id_days(self, start: date, end: date, days: dict) -> dict:
+        """ Number of instructional days in [start, end) for each weekday in days """
+        return {day: self.cal_dict.count(DayType.ID, start, end, day.value) for day in days}
+
+    def count_awd_days(self, start: date, end: date, weekday: int = None) -> int:
+        """ Number of days in [start, end) that compute_awd counted as Academic Work Days """
+        total = 0
+        # every weekday before the first day of fall counts
+        if start < self.fall_semester_start:
+            total += count_weekdays(max(start, self.start_date), min(end, self.fall_semester_start), weekday)
+        # after that, every day of an AWD type up to where the count was reached
+        lo, hi = max(start, self.fall_semester_start), min(end, self.awd_end)
+        if lo < hi:
+            total += sum(self.cal_dict.count(day_type, lo, hi, weekday) for day_type in AWD_DAY_TYPES)
+        return total
+
+    def render_schedule(self) -> Image:
+        """ Draw the schedule left behind by the last successful compute_schedule """
+        with metrics.timer("render"):
+            return self._render_schedule()
+
+    def _render_schedule(self) -> Image:
+        # Text measurements are cached across candidates, this is a no-op after the first render
+        prime_metrics([self.font, self.small_font, self.small_font_bold], [self.start_date.year, self.start_date.year + 1])
+        # clear current calendar list
+        current_calendar: list[CalMonth] = []
+
         # Build calendar year starting at start date
         for i in range(13):
             cur_date = self.start_date + relativedelta(months=i)
@@ -163,23 +324,24 @@ class CalYear:
             cur_day = date(current_calendar[i].year, current_calendar[i].month, 1)
             end_day = cur_day + relativedelta(months=1)
             while cur_day < end_day:
-                if cur_day in self.cal_dict and DayType.AWD == self.cal_dict[cur_day]:
+                day_type = self.cal_dict.get(cur_day)
+                if DayType.AWD == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day, self.legend_data["AWD"])
-                elif cur_day in self.cal_dict and DayType.ID == self.cal_dict[cur_day]:
+                elif DayType.ID == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day, self.legend_data["ID"])
-                elif cur_day in self.cal_dict and DayType.NO_CLASS_CAMPUS_OPEN == self.cal_dict[cur_day]:
+                elif DayType.NO_CLASS_CAMPUS_OPEN == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day, self.legend_data["No Class, Campus Open"])
-                elif cur_day in self.cal_dict and DayType.WINTER_SESSION == self.cal_dict[cur_day]:
+                elif DayType.WINTER_SESSION == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day, self.legend_data["Winter Session"])
-                elif cur_day in self.cal_dict and DayType.FINALS == self.cal_dict[cur_day]:
+                elif DayType.FINALS == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day, self.legend_data["Finals"])
-                elif cur_day in self.cal_dict and DayType.HOLIDAY == self.cal_dict[cur_day]:
+                elif DayType.HOLIDAY == day_type:
                     current_calendar[i].set_day_bold(cur_day.day)
-                elif cur_day in self.cal_dict and DayType.SUMMER_SESSION == self.cal_dict[cur_day]:
+                elif DayType.SUMMER_SESSION == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day,self.legend_data["Summer Session"])
-                elif cur_day in self.cal_dict and DayType.CONVOCATION == self.cal_dict[cur_day]:
+                elif DayType.CONVOCATION == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day,self.legend_data["Convocation"])
-                elif cur_day in self.cal_dict and DayType.COMMENCEMENT == self.cal_dict[cur_day]:
+                elif DayType.COMMENCEMENT == day_type:
                     current_calendar[i].set_day_bgcolor(cur_day.day,self.legend_data["Commencement"])
                 cur_day = cur_day + timedelta(days=1)
 
@@ -198,83 +360,94 @@ class CalYear:
         current_calendar[(self.fall_semester_start.month+5)%13].set_day_bold_outline(self.fall_semester_start.day)
         current_calendar[(self.spring_semester_start.month-1+5)%13].set_day_bold_outline(self.spring_semester_start.day)
         current_calendar[(self.summer_session_start.month-1+5)%13].set_day_bold_outline(self.summer_session_start.day)
-        return self.draw(current_calendar), self.dict_hash(self.cal_dict)
-        # compute AWD
+        return self.draw(current_calendar)
 
-    def compute_awd(self, num_awd_days: int = 170) -> bool | int:
+    def compute_awd(self, num_awd_days: int = 170, convocation_day: date = None) -> bool | int:
         """ AWD must be between 170 - 180 """
         if num_awd_days < 170 or num_awd_days > 180:
+            self.failure = "awd_range"
             return False
 
+        store = self.cal_dict
         cur_date = self.start_date
         self.num_awd = 0
-        # christmas = date(self.start_date.year, 12, 25) # self.us_holidays.get_named("Christmas Day (observed)")[2]
+        # christmas = date(self.start_date.year, 12, 25) # self.holiday_index.christmas
 
         # For the week before instructional days start
         prelim_days_list = []
         while cur_date < self.fall_semester_start:
             # if current day isn't a Sunday, Saturday, or is a US Holiday
             if not is_weekend(cur_date):
-                if self.cal_dict[cur_date] == DayType.NONE:
-                    self.cal_dict[cur_date] = DayType.AWD
-                    if cur_date <= self.fall_semester_start + relativedelta(days=-2):
+                if store[cur_date] == DayType.NONE:
+                    store[cur_date] = DayType.AWD
+                    if cur_date <= self.fall_semester_start - timedelta(days=2):
                         prelim_days_list.append(cur_date)
                         
                 self.num_awd += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["AWD"] += 1
-                self.calc_awd_days(cur_date)
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
 
         if self.convocation_day == None:
-            self.convocation_day = random.choice(prelim_days_list)
-            self.cal_dict[self.convocation_day] = DayType.CONVOCATION
-        else:
-            self.calc_awd_days(self.convocation_day)
-        # self.month_stats[date(cur_date.year, cur_date.month, 1)]["AWD"] += 1
-        # self.num_awd +=1    
+            self.convocation_options = prelim_days_list
+            if convocation_day in prelim_days_list:
+                self.convocation_day = convocation_day
+            else:
+                self.convocation_day = self.pick_convocation_day(prelim_days_list)
+            store[self.convocation_day] = DayType.CONVOCATION
         
-        # For Fall Semester, While the current date is before Christmas
-        # while cur_date < date(self.start_date.year+1, self.start_date.month+1, self.start_date.day):
-            # if current day isn't a Sunday, Saturday, or is a US Holiday
+        # For Fall Semester onwards, walk the store by day offset until enough AWD are counted
+        off = store.offset(cur_date)
+        summer_off = store.offset(self.summer_session_start)
         while self.num_awd < num_awd_days:
-            if cur_date >= self.summer_session_start:
-                print("ERROR: AWD goes into summer session")
+            if off >= summer_off:
+                self.failure = "awd_into_summer"
                 return False
-            if self.cal_dict[cur_date] in [DayType.ID, DayType.AWD, DayType.FINALS, DayType.CONVOCATION, DayType.COMMENCEMENT]:
+            day_type = store.get_at(off)
+            if day_type in AWD_DAY_TYPES:
                 # these days are also AWD
                 self.num_awd += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["AWD"] += 1
-                self.calc_awd_days(cur_date)
-            elif not is_weekend(cur_date) and self.cal_dict[cur_date] == DayType.NONE:
-                self.cal_dict[cur_date] = DayType.AWD
+            elif store.weekday_at(off) < 5 and day_type == DayType.NONE:
+                store.set_at(off, DayType.AWD)
                 self.num_awd += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["AWD"] += 1
-                self.calc_awd_days(cur_date)
-                
-            cur_date = cur_date + relativedelta(days=1)
+            off += 1
+        cur_date = store.date_at(off)
+        self.awd_end = cur_date
 
         if cur_date <= self.commencement_end:
-            print("ERROR: Not enough AWD to build Calendar")
+            self.failure = "awd_short"
             return False
         
         if not is_weekend(cur_date) and self.cal_dict[cur_date] == DayType.NONE:
-            print("ERROR: Gap between end of spring and start of summer")
+            self.failure = "spring_summer_gap"
             return False
 
         # if not (is_weekend(cur_date) or self.cal_dict[cur_date] == self.summer_session_start or self.cal_dict[cur_date] == DayType.AWD):
         #     print("ERROR: Not enough AWD to finish commencement")
         #     return False
 
-        if self.cal_dict[self.winter_session_end + relativedelta(days=1)] == DayType.AWD:
-            print("ERROR: Spring cannot start on a Friday")
+        if self.cal_dict[self.winter_session_end + timedelta(days=1)] == DayType.AWD:
+            self.failure = "spring_friday_start"
             return False
         
         return self.num_awd
     
+    def pick_convocation_day(self, options: list[date]) -> date:
+        """ Convocation day chosen by the input's convocation_policy """
+        policy = self.inputs.convocation_policy
+        if policy == "first":
+            return options[0]
+        if policy == "last":
+            return options[-1]
+        if policy == "random":
+            return random.choice(options)
+        # "seeded" (and "enumerate" outside of build_years): reproducible for the same seed and parameters
+        rng = random.Random(f"{self.inputs.convocation_seed}:{self.params}")
+        return rng.choice(options)
+
     def compute_id(self, num_id_days:int = 145, num_convocation_days = 2) -> bool:
         """ Compute Instructional Days (ID) """
         # Total for Fall and Spring 145-149
         if num_id_days < 145 or num_id_days > 149:
+            self.failure = "id_range"
             return False
         self.num_id = 0
         
@@ -283,31 +456,31 @@ class CalYear:
         if self.inputs.friday_convocation:
             # get the next friday from the start date
             days_until_friday = (4 - self.start_date.weekday() + 7) % 7
-            self.convocation_day = self.start_date + relativedelta(days=days_until_friday)
+            self.convocation_day = self.start_date + timedelta(days=days_until_friday)
             self.cal_dict[self.convocation_day] = DayType.CONVOCATION
         
         self.fall_semester_start = add_weekdays(self.start_date, num_convocation_days)
 
         # If Fall semester start date is a friday, push to monday
         if self.fall_semester_start.weekday() == 4:
-            self.fall_semester_start = self.fall_semester_start + relativedelta(days=3)
+            self.fall_semester_start = self.fall_semester_start + timedelta(days=3)
         
         if self.convocation_day:
             if self.fall_semester_start < self.convocation_day:
-                print("ERROR: Fall Semester start day must be after convocation day")
+                self.failure = "convocation_after_fall_start"
                 return False
         
         # NEW CODE, return FALSE if fall semester doesn't start on a monday
         if self.inputs.monday_fall and self.fall_semester_start.weekday() != 0:
-            print("ERROR: Fall Semester start day must be a monday")
+            self.failure = "fall_not_monday"
             return False
         
         # Leave at least 4 AWD for grading before Christmas (HARD RULE?)
-        christmas_date = self.us_holidays.get_named("Christmas Day")[0]
+        christmas_date = self.holiday_index.christmas
         cur_date = christmas_date
         day_cnt = 0
         while day_cnt < 4:
-            cur_date = cur_date + relativedelta(days=-1)
+            cur_date = cur_date + timedelta(days=-1)
             if cur_date.weekday() != 5 and cur_date.weekday() != 6:
                 self.cal_dict[cur_date] = DayType.AWD
                 day_cnt += 1
@@ -318,27 +491,27 @@ class CalYear:
         if not self.inputs.monday_final:
             # we don't have to worry about starting finals on monday
             while day_cnt < 6: # 6 days of finals
-                cur_date = cur_date + relativedelta(days=-1)
+                cur_date = cur_date + timedelta(days=-1)
                 if cur_date.weekday() != 6: # not sunday
                     self.cal_dict[cur_date] = DayType.FINALS
                     day_cnt += 1
             start_of_fall_finals = cur_date
         else:
             # we have to start the finals on a Monday, that means finals will end on Sat
-            cur_date = cur_date + relativedelta(days=-1)
+            cur_date = cur_date + timedelta(days=-1)
             # find end date first (we want a Sat)
             while cur_date.weekday() != 5:
                 # set dates to AWD until we find our day
                 if not is_weekend(cur_date):
                     self.cal_dict[cur_date] = DayType.AWD
-                cur_date = cur_date + relativedelta(days=-1)
+                cur_date = cur_date + timedelta(days=-1)
             # we found the day, set 6 days of finals
             while day_cnt < 6: # 6 days of finals
                 if cur_date.weekday() != 6: # not sunday
                     self.cal_dict[cur_date] = DayType.FINALS
                     day_cnt += 1
-                cur_date = cur_date + relativedelta(days=-1)
-            start_of_fall_finals = cur_date + relativedelta(days=1)
+                cur_date = cur_date + timedelta(days=-1)
+            start_of_fall_finals = cur_date + timedelta(days=1)
             
         # Fill ID through start of Fall Finals
         fall_id_cnt = 0
@@ -347,19 +520,18 @@ class CalYear:
             if self.cal_dict[cur_date] == DayType.NONE and (cur_date.weekday() != 6 and cur_date.weekday() != 5):
                 self.cal_dict[cur_date] = DayType.ID
                 fall_id_cnt += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["ID"] += 1
-                self.calc_id_days('fall', cur_date)
 
-            cur_date = cur_date + relativedelta(days=1)
-        print(f"Fall IDs: {fall_id_cnt}")
+            cur_date = cur_date + timedelta(days=1)
+        log.debug("fall instructional days: %d", fall_id_cnt)
         # goto end of winter session
         cur_date = self.winter_session_end
-        cur_date = cur_date + relativedelta(days=1)
+        cur_date = cur_date + timedelta(days=1)
         
         if self.inputs.even:
+            self.day_id_count['fall'] = self.count_id_days(self.fall_semester_start, start_of_fall_finals, self.day_id_count['fall'])
             for key in self.day_id_count['fall'].keys():
                 if self.day_id_count['fall'][key] < 14 or self.day_id_count['fall'][key] > 15:
-                    print("ERROR: instructional for fall are not equal")
+                    self.failure = "fall_uneven"
                     return False
 
         """ SPRING SEMESTER START DATE """
@@ -370,41 +542,43 @@ class CalYear:
             spring_start_date = date(self.start_date.year+1, 1, 16)
         if self.inputs.MLK_spring:
             # set spring start date to after MLK
-            spring_start_date = self.us_holidays.get_named("Martin Luther King Jr. Day")[1] + relativedelta(days=1)
+            spring_start_date = self.holiday_index.mlk_day + timedelta(days=1)
         while cur_date < spring_start_date:
             # set days to start of spring semester as AWD -- TODO: check if correct
             if not is_weekend(cur_date) and self.cal_dict[cur_date] == DayType.NONE:
                 self.cal_dict[cur_date] = DayType.AWD
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
         while is_weekend(cur_date) or self.cal_dict[cur_date] != DayType.NONE:
             # we need to keep incrementing the day pointer until we get to a valid start date for spring
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
         self.spring_semester_start = cur_date
         
         # If Spring semester start date is a friday, push to monday
         if self.spring_semester_start.weekday() == 4:
-            self.spring_semester_start = self.spring_semester_start + relativedelta(days=3)
+            self.spring_semester_start = self.spring_semester_start + timedelta(days=3)
 
         # Fill ID through Spring Finals
         spring_id_cnt = 0
         min_remaining_ids = num_id_days - fall_id_cnt
         cur_date = self.spring_semester_start
+        spring_end_limit = date(self.start_date.year + 1, 6, 1)
         while spring_id_cnt < min_remaining_ids:
             if self.cal_dict[cur_date] == DayType.NONE and (cur_date.weekday() != 6 and cur_date.weekday() != 5):
                 self.cal_dict[cur_date] = DayType.ID
                 spring_id_cnt += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["ID"] += 1
-                self.calc_id_days('spring', cur_date)
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
+            if cur_date > spring_end_limit:
+                # already past the deadline checked below, no need to place the rest
+                break
         # CHECK: spring end date must be May 31st or sooner (cur_date is now +1)
         if cur_date > date(cur_date.year, 6, 1):
-            print("ERROR: Spring semester ended past May 31st")
+            self.failure = "spring_past_may"
             return False
         
         # This is the spring final exam start date
         spring_final_exam_start = cur_date 
         if spring_final_exam_start.weekday() == 6:
-            spring_final_exam_start = spring_final_exam_start + relativedelta(days=1)
+            spring_final_exam_start = spring_final_exam_start + timedelta(days=1)
         remaining_id_buffer = 149 - num_id_days
         if self.inputs.monday_spring_final == True:
             while spring_final_exam_start.weekday() != 0:
@@ -413,15 +587,14 @@ class CalYear:
                     self.cal_dict[spring_final_exam_start] = DayType.ID
                     remaining_id_buffer -= 1
                     spring_id_cnt += 1
-                    self.month_stats[date(cur_date.year, cur_date.month, 1)]["ID"] += 1
-                    self.calc_id_days('spring', cur_date)
-                spring_final_exam_start = spring_final_exam_start + relativedelta(days=1)
-        print(f"Spring IDs: {spring_id_cnt}")
+                spring_final_exam_start = spring_final_exam_start + timedelta(days=1)
+        log.debug("spring instructional days: %d", spring_id_cnt)
 
         if self.inputs.even:
+            self.day_id_count['spring'] = self.count_id_days(self.spring_semester_start, spring_final_exam_start, self.day_id_count['spring'])
             for key in self.day_id_count['spring'].keys():
                 if self.day_id_count['spring'][key] < 14 or self.day_id_count['spring'][key] > 15:
-                    print("ERROR: instructional for spring are not equal")
+                    self.failure = "spring_uneven"
                     return False
 
         # FILL IN SPRING FINAL EXAMS HERE
@@ -432,7 +605,7 @@ class CalYear:
             if cur_date.weekday() != 6:
                 self.cal_dict[cur_date] = DayType.FINALS
                 day_cnt += 1
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
         
         # Calculate commencment start date
         while self.commencement_start == None:
@@ -442,7 +615,7 @@ class CalYear:
                         self.commencement_start = cur_date
                 else:
                     self.commencement_start = cur_date
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
 
         cur_date = self.commencement_start
 
@@ -451,13 +624,13 @@ class CalYear:
             if not is_weekend(cur_date):
                 self.cal_dict[cur_date] = DayType.COMMENCEMENT
                 day_cnt += 1
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
 
-        self.commencement_end = cur_date + relativedelta(days=-1)
+        self.commencement_end = cur_date + timedelta(days=-1)
 
         self.num_id = fall_id_cnt + spring_id_cnt
         # #CHECK: commencement goes into summer session
-        # cur_date = cur_date + relativedelta(days=-1)
+        # cur_date = cur_date + timedelta(days=-1)
         # if cur_date >= self.summer_session_start:
         #     print("ERROR: commencement overran summer session start date")
         #     return False
@@ -465,19 +638,8 @@ class CalYear:
     
     def compute_spring_break(self, combine_cc_day=True) -> bool:
         """ Calculates spring break and ensures Cesar Chavez Day is correctly assigned """
-        cesar_date = None
-
-        # Get Cesar Chavez Day, if it's a weekend, get the observed date
-        for cd in self.us_holidays.get_named("Cesar Chavez Day"):
-            if cd.year == (self.start_date.year + 1):
-                cesar_date = cd
-                if is_weekend(cesar_date):
-                    if cesar_date.weekday() == 5:  # Saturday
-                        cesar_date = cesar_date + relativedelta(days=2)  # Move to Monday
-                    elif cesar_date.weekday() == 6:  # Sunday
-                        cesar_date = cesar_date + relativedelta(days=-2)  # Move to Friday
-                    print(f"Cesar Chavez Day falls on a weekend. Observing it on {cesar_date}.")
-                break  # Ensure we use the first instance found for the correct year
+        # Cesar Chavez Day of the spring semester, already moved off the weekend by the holiday index
+        cesar_date = self.holiday_index.cesar_chavez
 
         # If no Cesar Chavez Day is found, raise an error (instead of using a fallback) to catch the issue
         if cesar_date is None:
@@ -493,7 +655,7 @@ class CalYear:
                 cur_date = cur_date + relativedelta(days=1)
         else:
             # Put spring break before Cesar Chavez Day
-            easter_monday_following_year = self.us_holidays.get_named("Easter Monday")[1]
+            easter_monday_following_year = self.holiday_index.easter_monday
             spring_break_start = easter_monday_following_year + relativedelta(days=-7)
             spring_break_end = easter_monday_following_year + relativedelta(days=-3)
             if spring_break_start <= cesar_date <= spring_break_end:
@@ -510,17 +672,16 @@ class CalYear:
         New_Years = date(self.start_date.year+1, 1, 1)
         wnt_cnt = 1
         cur_date = New_Years 
-        self.winter_session_start = cur_date + relativedelta(days=1)
+        self.winter_session_start = cur_date + timedelta(days=1)
         if self.inputs.limit_winter_session:
             winter_sess_len = 10
             self.winter_session_id = winter_sess_len
         while (wnt_cnt <= winter_sess_len):
-            cur_date = cur_date + relativedelta(days=1)
+            cur_date = cur_date + timedelta(days=1)
             if (not is_weekend(cur_date)) and self.cal_dict[cur_date] == DayType.NONE:
                 self.cal_dict[cur_date] = DayType.WINTER_SESSION
                 wnt_cnt += 1
                 self.winter_session_id += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["WIN"] += 1
         self.winter_session_end = cur_date
         return True
         
@@ -528,7 +689,7 @@ class CalYear:
 
     def compute_summer_session(self) -> bool:
         if self.inputs.summer_sessession_start:
-            self.summer_session_start = self.us_holidays.get_named("Memorial Day")[1]
+            self.summer_session_start = self.holiday_index.memorial_day
         else:
             self.summer_session_start = self.commencement_start + relativedelta(days=4)
         self.summer_session_start = self.summer_session_start + relativedelta(days=1)
@@ -545,11 +706,11 @@ class CalYear:
         # Populate Calendar with Summer Session Days for 12 weeks 
         cur_date = self.summer_session_start
         summer_session_end = self.summer_session_start + timedelta(weeks=11) + timedelta(days=(6 - self.summer_session_start.weekday()))
+        self.summer_session_end = summer_session_end
         while cur_date <= summer_session_end:
             if (not is_weekend(cur_date)) and self.cal_dict.get(cur_date, DayType.NONE) == DayType.NONE:
                 self.cal_dict[cur_date] = DayType.SUMMER_SESSION
                 self.summer_session_id += 1
-                self.month_stats[date(cur_date.year, cur_date.month, 1)]["SUM"] += 1
 
             # Move to the next day
             cur_date += timedelta(days=1)
@@ -603,34 +764,23 @@ class CalYear:
         cur_date = self.start_date
         end_date = self.start_date + relativedelta(years=1)
 
-        while cur_date < end_date:
-            # Ensure all dates are added to cal_dict, initializing them as NONE by default
-            self.cal_dict[cur_date] = DayType.NONE
-
-            # Check if cur_date is a holiday using the self.us_holidays list
-            if cur_date in self.us_holidays:
-                # Check if the holiday is in your predefined list of holidays (e.g., Thanksgiving, Christmas, etc.)
-                for holiday_name in self.holiday_list:
-                    if holiday_name in self.us_holidays.get(cur_date):
-                        self.cal_dict[cur_date] = DayType.HOLIDAY
-                        break
-
-            # Move to the next day
-            cur_date = cur_date + relativedelta(days=1)
+        # Ensure all dates are added to cal_dict, initializing them as NONE by default
+        self.cal_dict.fill(cur_date, end_date, DayType.NONE)
+        # Mark the campus holidays (Thanksgiving, Christmas, etc.) from the shared holiday index
+        for holiday_date in self.holiday_index.dates:
+            if cur_date <= holiday_date < end_date:
+                self.cal_dict[holiday_date] = DayType.HOLIDAY
 
         # Handle special events like Thanksgiving week off if extended fall is selected
         if self.inputs.extended_fall:
-            thanksgiving_day = self.us_holidays.get_named("Thanksgiving")[0]
+            thanksgiving_day = self.holiday_index.thanksgiving
             for i in range(1, 4):  # The three days before Thanksgiving
-                self.cal_dict[thanksgiving_day - relativedelta(days=i)] = DayType.NO_CLASS_CAMPUS_OPEN
+                self.cal_dict[thanksgiving_day - timedelta(days=i)] = DayType.NO_CLASS_CAMPUS_OPEN
 
         # Handle the days from Christmas (Dec 26) to New Year's (Jan 1) as VOID days
         day_after_xmas = date(self.start_date.year, 12, 26)
         new_year = date(self.start_date.year + 1, 1, 1)
-        cur_date = day_after_xmas
-        while cur_date <= new_year:
-            self.cal_dict[cur_date] = DayType.VOID
-            cur_date = cur_date + relativedelta(days=1)
+        self.cal_dict.fill(day_after_xmas, new_year + timedelta(days=1), DayType.VOID)
 
         # If there are additional AWD, ID, or Convocation events, populate them here
         self.populate_event_days()
@@ -641,52 +791,52 @@ class CalYear:
         # Example: Add AWD (Alternative Work Days) event days
         for awd_day in self.awd_dates_list:
             self.cal_dict[awd_day] = DayType.AWD
-            print(f"AWD day populated: {awd_day} -> {DayType.AWD}")
+            log.debug("AWD day populated: %s", awd_day)
 
         # Example: Add Instructional Days (ID) event days
         for id_day in self.id_dates_list:
             self.cal_dict[id_day] = DayType.ID
-            print(f"ID day populated: {id_day} -> {DayType.ID}")
+            log.debug("ID day populated: %s", id_day)
 
         # Example: Add Convocation Day
         if self.convocation_day:
             self.cal_dict[self.convocation_day] = DayType.CONVOCATION
-            print(f"Convocation day populated: {self.convocation_day} -> {DayType.CONVOCATION}")
+            log.debug("CONVOCATION day populated: %s", self.convocation_day)
         
         # Example: Add Finals days
         for finals_day in self.finals_dates_list:
             self.cal_dict[finals_day] = DayType.FINALS
-            print(f"Finals day populated: {finals_day} -> {DayType.FINALS}")
+            log.debug("FINALS day populated: %s", finals_day)
         
         # Example: Add Commencement days (for graduation events)
         for commencement_day in self.commencement_dates_list:
             self.cal_dict[commencement_day] = DayType.COMMENCEMENT
-            print(f"Commencement day populated: {commencement_day} -> {DayType.COMMENCEMENT}")
+            log.debug("COMMENCEMENT day populated: %s", commencement_day)
         
         # Example: No Class but Campus Open days (typically holidays where staff might work, but classes aren't in session)
         for no_class_day in self.no_class_campus_open_dates_list:
             self.cal_dict[no_class_day] = DayType.NO_CLASS_CAMPUS_OPEN
-            print(f"No Class/Campus Open day populated: {no_class_day} -> {DayType.NO_CLASS_CAMPUS_OPEN}")
+            log.debug("NO_CLASS_CAMPUS_OPEN day populated: %s", no_class_day)
         
         # Example: Add Summer Session days
         for summer_session_day in self.summer_session_dates_list:
             self.cal_dict[summer_session_day] = DayType.SUMMER_SESSION
-            print(f"Summer Session day populated: {summer_session_day} -> {DayType.SUMMER_SESSION}")
+            log.debug("SUMMER_SESSION day populated: %s", summer_session_day)
         
         # Example: Add Winter Session days
         for winter_session_day in self.winter_session_dates_list:
             self.cal_dict[winter_session_day] = DayType.WINTER_SESSION
-            print(f"Winter Session day populated: {winter_session_day} -> {DayType.WINTER_SESSION}")
+            log.debug("WINTER_SESSION day populated: %s", winter_session_day)
 
         # Example: Add other holidays or custom events
         for holiday_date in self.holiday_dates_list:
             self.cal_dict[holiday_date] = DayType.HOLIDAY
-            print(f"Holiday populated: {holiday_date} -> {DayType.HOLIDAY}")
+            log.debug("HOLIDAY day populated: %s", holiday_date)
 
         # If there are any VOID days (days that are inactive or unimportant in the calendar, e.g., non-working days in a session):
         for void_day in self.void_dates_list:
             self.cal_dict[void_day] = DayType.VOID
-            print(f"VOID day populated: {void_day} -> {DayType.VOID}")
+            log.debug("VOID day populated: %s", void_day)
 
 
     def draw(self, calendar : list[CalMonth], m_width=350, m_height=350) -> Image:
@@ -699,7 +849,8 @@ class CalYear:
         images = []
         j = 0
         for month in calendar:
-            image = month.draw(m_width)
+            with metrics.timer("month_draw"):
+                image = month.draw(m_width, use_template=self.render_mode == "template")
             images.append(image)
             months_list.append(month.get_abbr())
 
@@ -716,8 +867,13 @@ class CalYear:
         awd_month_fall = []
         id_month_fall = []
 
-        draw = ImageDraw.Draw(result_image)
-        draw.text((1100,900), f"Academic Work Days = {self.num_awd}\nInstructional Days = {self.num_id}\nWinter = {self.winter_session_id}\nSummer = {self.summer_session_id}", font=self.font, fill="black")
+        summary = f"Academic Work Days = {self.num_awd}\nInstructional Days = {self.num_id}\nWinter = {self.winter_session_id}\nSummer = {self.summer_session_id}"
+        if self.render_mode == "template":
+            tile, offset = _text_tile(summary, self.font)
+            result_image.paste(tile, (1100 + offset[0], 900 + offset[1]))
+        else:
+            draw = ImageDraw.Draw(result_image)
+            draw.text((1100,900), summary, font=self.font, fill="black")
         
         # Populate ID and AWD List with the number of each day type per month
         cur_date = date(self.start_date.year, self.start_date.month, 1)
@@ -740,39 +896,17 @@ class CalYear:
         result_image.paste(im, box)
 
         # reference color_legend and display it
-        im = self.create_table_key(self.legend_data)#self.get_legend_table()
+        if self.render_mode == "template":
+            # the legend never changes, it is drawn once per process
+            im = _table_key(tuple(self.legend_data.items()), self.small_font, self.small_font_size)
+        else:
+            im = self.create_table_key(self.legend_data)#self.get_legend_table()
         result_image.paste(im, [width//2-500, 0]) #TODO: Fit more evenly
 
         return result_image        
 
     def create_table_key(self, legend_data, cell_height=30, padding=5):
-        # Compute total width based on text length and padding
-        total_width = sum([ImageDraw.Draw(Image.new('RGB', (1, 1))).textsize(text, self.small_font)[0] + padding*3 + cell_height for text in legend_data.keys()]) + padding
-        # Create a new image with a white background
-        img_width = total_width
-        img_height = cell_height
-        img = Image.new('RGB', (img_width, img_height), 'white')
-        draw = ImageDraw.Draw(img)
-
-        # Set font
-        #font = ImageFont.truetype(font_path, font_size)
-
-        # Draw each colored rectangle and label
-        x_offset = 0
-        for label, color in legend_data.items():
-            # Draw rectangle
-            draw.rectangle([(x_offset, padding), (x_offset + cell_height - 2*padding, img_height - padding)], fill=color)
-        
-            # Draw border around rectangle
-            draw.rectangle([(x_offset, padding), (x_offset + cell_height - 2*padding, img_height - padding)], outline='black', width=1)
-            x_offset += cell_height
-
-            # Draw label
-            text_width, _ = draw.textsize(label, font=self.small_font)
-            draw.text((x_offset, (cell_height - self.small_font_size) // 2), label, font=self.small_font, fill='black')
-            x_offset += text_width + padding*2
-
-        return img
+        return draw_table_key(legend_data, self.small_font, self.small_font_size, cell_height, padding)
 
     def create_months_table(self, months: list, awd: list, id: list, table_width: int = 550, cell_height: int = 40, font_size: int = 16) -> bytes:
         '''Creates''' 
@@ -796,23 +930,33 @@ class CalYear:
         awd_spring.append(sum(awd_spring))
         id_spring.append(sum(id_spring))
 
+        values = [months_fall, awd_fall, id_fall, months_spring, awd_spring, id_spring]
+        fill_color = [
+            ['white'] * 6,  # Month column background color
+            [self.legend_data["AWD"]] * 6,   # AWD column background color
+            [self.legend_data["ID"]] * 6,    # ID column background color
+
+            ['white'] * 6,  # Month column background color
+            [self.legend_data["AWD"]] * 6,   # AWD column background color
+            [self.legend_data["ID"]]* 6,    # ID column background color
+        ]
+        return self.render_table(header, values, fill_color, table_width, cell_height, font_size)
+    
+    def render_table(self, header: list, values: list, fill_color: list, table_width: int, cell_height: int, font_size: int) -> Image:
+        """ Draw a table with the configured backend, "pil" or "plotly" (kaleido, kept for comparison) """
+        if self.table_backend != "plotly":
+            with metrics.timer("table"):
+                return draw_table(header, values, fill_color, table_width=table_width, cell_height=cell_height, font_size=font_size,
+                                  use_template=self.render_mode == "template")
+
+        import plotly.graph_objects as go
         # Create the table using plotly.graph_objects
         fig = go.Figure(data=[go.Table(
             header=dict(values=header, line = dict(color='black', width=1), height = cell_height, font = dict(size = font_size)),
-            cells=dict(values=[months_fall,awd_fall,id_fall, months_spring, awd_spring, id_spring], 
+            cells=dict(values=values, 
                 height = cell_height,
-
-            fill_color=[
-                ['white'] * 6,  # Month column background color
-                [self.legend_data["AWD"]] * 6,   # AWD column background color
-                [self.legend_data["ID"]] * 6,    # ID column background color
-
-                ['white'] * 6,  # Month column background color
-                [self.legend_data["AWD"]] * 6,   # AWD column background color
-                [self.legend_data["ID"]]* 6,    # ID column background color
-            ],
-
-            line = dict(color='black', width=1),
+                fill_color=fill_color,
+                line = dict(color='black', width=1),
             )
         )])
         # Define size of Overall Image
@@ -825,10 +969,11 @@ class CalYear:
         fig.update_traces(cells_font=dict(size = font_size))
 
         # Show the table
-        bytes = BytesIO(fig.to_image(format='png'))
+        with metrics.timer("kaleido"):
+            bytes = BytesIO(fig.to_image(format='png'))
         im = Image.open(bytes)
         return im
-    
+
     def dict_hash(self, dictionary: Dict[str, Any]) -> str:
         """MD5 hash of a dictionary."""
         dhash = hashlib.md5()
@@ -846,8 +991,9 @@ class CalYear:
             "summer_session_id": self.summer_session_id,
             "winter_session_id": self.winter_session_id,
             "num_awd": self.num_awd,
-            "num_id": self.num_id
-                                                                  
+            "num_id": self.num_id,
+            # Every day's type, so equal hashes mean identical calendars even across different inputs
+            "days": hashlib.md5(self.cal_dict.tobytes()).hexdigest()
         }
         # for key in dictionary.keys():
         #     keystr = key.strftime("%m/%d/%Y")
@@ -857,6 +1003,36 @@ class CalYear:
         dhash.update(encoded)
         return dhash.hexdigest()
     
+    def schedule_data(self) -> dict:
+        """ Key dates and counts of the last computed schedule, as plain JSON types """
+        return {
+            "start_date": self.start_date.isoformat(),
+            **{name: getattr(self, name).isoformat() for name in SCHEDULE_DATES},
+            "num_awd": self.num_awd,
+            "num_id": self.num_id,
+            "winter_session_id": self.winter_session_id,
+            "summer_session_id": self.summer_session_id,
+            "month_stats": {month.isoformat(): dict(stats) for month, stats in self.month_stats.items()},
+            "day_id_count": {season: {day.name: count for day, count in counts.items()} for season, counts in self.day_id_count.items()},
+            "day_awd_count": {season: {day.name: count for day, count in counts.items()} for season, counts in self.day_awd_count.items()},
+            # Type of every day from the first of the start month, as [type name, number of days] runs (None = outside the year)
+            "days": {
+                "origin": self.cal_dict.origin.isoformat(),
+                "runs": [[day_type.name if day_type is not None else None, length] for day_type, length in self.cal_dict.runs()]
+            }
+        }
+
+    def load_schedule_data(self, data: dict):
+        """ Put back the finished schedule a schedule_data() dict describes, without running any scheduling rule """
+        for name in SCHEDULE_DATES:
+            setattr(self, name, date.fromisoformat(data[name]))
+        for name in ("num_awd", "num_id", "winter_session_id", "summer_session_id"):
+            setattr(self, name, data[name])
+        self.month_stats = {date.fromisoformat(month): dict(stats) for month, stats in data["month_stats"].items()}
+        self.day_id_count = {season: {Day[day]: count for day, count in counts.items()} for season, counts in data["day_id_count"].items()}
+        self.day_awd_count = {season: {Day[day]: count for day, count in counts.items()} for season, counts in data["day_awd_count"].items()}
+        self.cal_dict = DayStore.from_runs(date.fromisoformat(data["days"]["origin"]), data["days"]["runs"], DayType)
+
     def create_days_table(self, awd: list, id: list, table_width: int = 550, cell_height: int = 40, font_size: int = 16) -> bytes:
         '''Creates''' 
         # Data for the table
@@ -876,52 +1052,22 @@ class CalYear:
         awd_spring.append(sum(awd_spring))
         id_spring.append(sum(id_spring))
 
-        # Create the table using plotly.graph_objects
-        fig = go.Figure(data=[go.Table(
-            header=dict(values=header, line = dict(color='black', width=1), height = cell_height, font = dict(size = font_size)),
-            cells=dict(values=[days,awd_fall,id_fall, days, awd_spring, id_spring], 
-                height = cell_height,
-
-            fill_color=[
-                ['white'] * 7,  # Month column background color
-                [self.legend_data["AWD"]] * 7,   # AWD column background color
-                [self.legend_data["ID"]] * 7,    # ID column background color
-
-                ['white'] * 7,  # Month column background color
-                [self.legend_data["AWD"]] * 7,   # AWD column background color
-                [self.legend_data["ID"]] * 7,    # ID column background color
-            ],
-
-            line = dict(color='black', width=1),
-            )
-        )])
-        # Define size of Overall Image
-        fig.update_layout(
-            autosize=False,
-            width= table_width,
-            height= 550,
-            margin=dict(l=0, r=5, t=0, b=0)  # Add this line
-        )
-        fig.update_traces(cells_font=dict(size = font_size))
-
-        # Show the table
-        bytes = BytesIO(fig.to_image(format='png'))
-        im = Image.open(bytes)
-        return im
+        values = [days, awd_fall, id_fall, days, awd_spring, id_spring]
+        fill_color = [
+            ['white'] * 7,  # Month column background color
+            [self.legend_data["AWD"]] * 7,   # AWD column background color
+            [self.legend_data["ID"]] * 7,    # ID column background color
+
+            ['white'] * 7,  # Month column background color
+            [self.legend_data["AWD"]] * 7,   # AWD column background color
+            [self.legend_data["ID"]] * 7,    # ID column background color
+        ]
+        return self.render_table(header, values, fill_color, table_width, cell_height, font_size)
     
     def get_legend_table(self):
         im = Image.open('test_legend.png')
         return im
     
-    def calc_id_days(self, semester: str, the_date: date):
-        self.day_id_count[semester][Day(the_date.weekday())] += 1
-
-    def calc_awd_days(self, the_date: date):
-        if the_date < self.spring_semester_start:
-            self.day_awd_count['fall'][Day(the_date.weekday())] += 1
-        else:
-            self.day_awd_count['spring'][Day(the_date.weekday())] += 1
-    
     def get_day_type(self, year, month, day):
         """Return the day type for a specific date"""
         the_date = date(year, month, day)
@@ -932,225 +1078,57 @@ class CalYear:
         else:
             return DayType.NONE  # Default to DayType.NONE if the date isn't in the dictionary
         
-    def generate_colored_excel_calendar(self):
-        # Create a new workbook and select the active worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Academic Calendar"
-
-        # Define the color map for each DayType
-        day_type_colors = {
-            DayType.NONE: "FFFFFF",  # White
-            DayType.AWD: "CCE5FF",   # Light blue
-            DayType.ID: "EFEF95",    # Yellow
-            DayType.CONVOCATION: "50E3C2",
-            DayType.FINALS: "F8CBAD",
-            DayType.NO_CLASS_CAMPUS_OPEN: "AE76C7",
-            DayType.COMMENCEMENT: "BD10E0",
-            DayType.SUMMER_SESSION: "C5E0B4",
-            DayType.WINTER_SESSION: "CFCFCF",
-            DayType.HOLIDAY: "FFC107",
-            DayType.VOID: "BDBDBD"
-        }
-
-        # Set the starting position for the calendar layout
-        start_row = 2
-        start_col = 1
-
-        # Define the number of rows each month should occupy
-        rows_per_month = 11  # Adjusted to include month name, headers, weeks, note, and padding
-
-        # Iterate through each month and populate the calendar in Excel
-        for month_index, cal_month in enumerate(self.months):
-            row_offset = start_row + (month_index // 3) * rows_per_month
-            col_offset = start_col + (month_index % 3) * 8
-
-            # Write the month name
-            ws.cell(row=row_offset, column=col_offset, value=cal_month.get_title()).font = Font(bold=True)
-
-            # Day headers
-            for i, day_name in enumerate(["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"], start=col_offset):
-                ws.cell(row=row_offset + 1, column=i, value=day_name).alignment = Alignment(horizontal="center")
-
-            # Populate days with colors
-            for week_row, week in enumerate(cal_month.cal, start=row_offset + 2):
-                for day_col, day in enumerate(week, start=col_offset):
-                    if day == 0:
-                        continue
-                    cell = ws.cell(row=week_row, column=day_col, value=day)
-                    date_obj = date(cal_month.year, cal_month.month, day)
-                    if date_obj in self.cal_dict:
-                        day_type = self.cal_dict[date_obj]
-                        cell.fill = PatternFill(start_color=day_type_colors[day_type], end_color=day_type_colors[day_type], fill_type="solid")
-                        if day_type in [DayType.HOLIDAY, DayType.COMMENCEMENT]:
-                            cell.font = Font(bold=True)
-
-            # Ensure the calendar occupies 6 weeks
-            num_weeks = len(cal_month.cal)
-            for extra_row in range(6 - num_weeks):
-                week_row = row_offset + 2 + num_weeks + extra_row
-                for day_col in range(col_offset, col_offset + 7):
-                    ws.cell(row=week_row, column=day_col, value="")
-
-            # The note should be on the row after the 6th week
-            note_row = row_offset + 2 + 6
-
-            # Retrieve month stats
-            month_key = date(cal_month.year, cal_month.month, 1)
-            stats = self.month_stats.get(month_key, {})
-            note_parts = []
-            if stats.get('AWD'):
-                note_parts.append(f"AWD={stats['AWD']}")
-            if stats.get('ID'):
-                note_parts.append(f"ID={stats['ID']}")
-            if stats.get('SUM'):
-                note_parts.append(f"SUM={stats['SUM']}")
-            if stats.get('WIN'):
-                note_parts.append(f"WIN={stats['WIN']}")
-            note_text = ", ".join(note_parts)
-
-            # Write the note under the calendar
-            if note_text:
-                ws.cell(row=note_row, column=col_offset, value=note_text).font = Font(italic=True)
-
-        # Calculate the total height of the months grid
-        months_per_row = 3
-        num_rows_of_months = (len(self.months) + months_per_row - 1) // months_per_row
-        total_months_height = num_rows_of_months * rows_per_month
-
-        # Add some padding rows after the last month
-        padding_after_months = 3
-
-        # Starting row for the Months Table
-        table_start_row = start_row + total_months_height + padding_after_months
-        table_start_col = start_col
-
-        # Set the starting position for the legend
-        legend_row = start_row
-        legend_col = start_col + months_per_row * 8  # Adjust based on months per row and columns per month
-
-        # Write the legend
-        for index, (day_type, color) in enumerate(day_type_colors.items()):
-            row = legend_row + index
-            ws.cell(row=row, column=legend_col, value=day_type.name).alignment = Alignment(horizontal='left')
-            color_cell = ws.cell(row=row, column=legend_col + 1)
-            color_cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
-
-        # Adjust the summary placement to sit to the right of the legend
-        summary_row = legend_row + len(day_type_colors) + 2
-        summary_col = legend_col
-
-        ws.cell(row=summary_row, column=summary_col, value=f"Academic Work Days = {self.num_awd}").font = Font(bold=True)
-        ws.cell(row=summary_row + 1, column=summary_col, value=f"Instructional Days = {self.num_id}").font = Font(bold=True)
-        ws.cell(row=summary_row + 2, column=summary_col, value=f"Winter Session = {self.winter_session_id}").font = Font(bold=True)
-        ws.cell(row=summary_row + 3, column=summary_col, value=f"Summer Session = {self.summer_session_id}").font = Font(bold=True)
-
-        # Create Months Table
-        # Collect months for Fall (August to December)
-        months_fall = []
-        awd_fall = []
-        id_fall = []
-
-        aug_count = 0
-        for cal_month in self.months:
-            if cal_month.month == 8: aug_count += 1
-            if cal_month.month in [8, 9, 10, 11, 12]:  # August to December
-                if aug_count == 2: break
-                months_fall.append(cal_month.get_abbr())
-                stats = self.month_stats.get(date(cal_month.year, cal_month.month, 1), {})
-                awd_fall.append(stats.get('AWD', 0))
-                id_fall.append(stats.get('ID', 0))
-
-        # Collect months for Spring (January to May)
-        months_spring = []
-        awd_spring = []
-        id_spring = []
-
-        for cal_month in self.months:
-            if cal_month.month in [1, 2, 3, 4, 5]:  # January to May
-                months_spring.append(cal_month.get_abbr())
-                stats = self.month_stats.get(date(cal_month.year, cal_month.month, 1), {})
-                awd_spring.append(stats.get('AWD', 0))
-                id_spring.append(stats.get('ID', 0))
-
-        # Add totals
-        months_fall.append('Total')
-        awd_fall.append(sum(awd_fall))
-        id_fall.append(sum(id_fall))
-
-        months_spring.append('Total')
-        awd_spring.append(sum(awd_spring))
-        id_spring.append(sum(id_spring))
-
-        # Define the colors
-        void_color = day_type_colors[DayType.VOID]
-        awd_color = day_type_colors[DayType.AWD]
-        id_color = day_type_colors[DayType.ID]
-
-        # Write headers with background colors for Months Table
-        headers = ['Fall', 'AWD', 'ID', 'Spring', 'AWD', 'ID']
-        header_colors = [void_color, awd_color, id_color, void_color, awd_color, id_color]
-
-        for col_offset, (header, color) in enumerate(zip(headers, header_colors)):
-            cell = ws.cell(row=table_start_row, column=table_start_col + col_offset, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
-
-        # Write data for Months Table
-        for idx in range(len(months_fall)):
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col, value=months_fall[idx])
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col + 1, value=awd_fall[idx])
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col + 2, value=id_fall[idx])
-
-        for idx in range(len(months_spring)):
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col + 3, value=months_spring[idx])
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col + 4, value=awd_spring[idx])
-            ws.cell(row=table_start_row + 1 + idx, column=table_start_col + 5, value=id_spring[idx])
-
-        # Starting row for the Days Table, add some padding rows after the Months Table
-        days_table_start_row = table_start_row + max(len(months_fall), len(months_spring)) + 3  # Adjust as needed
-        days_table_start_col = table_start_col
-
-        # Create Days Table
-        days = ['M', 'T', 'W', 'R', 'F', 'Sa', 'Total']
-
-        # Collect AWD and ID data per day
-        awd_fall_days = [self.day_awd_count['fall'].get(Day(i), 0) for i in range(6)]
-        id_fall_days = [self.day_id_count['fall'].get(Day(i), 0) for i in range(6)]
-        awd_spring_days = [self.day_awd_count['spring'].get(Day(i), 0) for i in range(6)]
-        id_spring_days = [self.day_id_count['spring'].get(Day(i), 0) for i in range(6)]
-
-        # Add totals
-        awd_fall_days.append(sum(awd_fall_days))
-        id_fall_days.append(sum(id_fall_days))
-        awd_spring_days.append(sum(awd_spring_days))
-        id_spring_days.append(sum(id_spring_days))
+    def generate_colored_excel_calendar(self) -> BytesIO:
+        """ Colored Excel workbook of the computed schedule, see excel.calendar_workbook """
+        from .excel import calendar_workbook
+        return calendar_workbook(self)
+
+
+
+def draw_table_key(legend_data: dict, font, font_size: int, cell_height: int = 30, padding: int = 5) -> Image:
+    """ Color legend: a swatch and a label per entry of legend_data, on one row """
+    # Compute total width based on text length and padding
+    total_width = sum([ImageDraw.Draw(Image.new('RGB', (1, 1))).textsize(text, font)[0] + padding*3 + cell_height for text in legend_data.keys()]) + padding
+    # Create a new image with a white background
+    img_width = total_width
+    img_height = cell_height
+    img = Image.new('RGB', (img_width, img_height), 'white')
+    draw = ImageDraw.Draw(img)
+
+    # Set font
+    #font = ImageFont.truetype(font_path, font_size)
+
+    # Draw each colored rectangle and label
+    x_offset = 0
+    for label, color in legend_data.items():
+        # Draw rectangle
+        draw.rectangle([(x_offset, padding), (x_offset + cell_height - 2*padding, img_height - padding)], fill=color)
+    
+        # Draw border around rectangle
+        draw.rectangle([(x_offset, padding), (x_offset + cell_height - 2*padding, img_height - padding)], outline='black', width=1)
+        x_offset += cell_height
 
-        # Write headers with background colors for Days Table
-        headers = ['Fall', 'AWD', 'ID', 'Spring', 'AWD', 'ID']
-        header_colors = [void_color, awd_color, id_color, void_color, awd_color, id_color]
+        # Draw label
+        text_width, _ = draw.textsize(label, font=font)
+        draw.text((x_offset, (cell_height - font_size) // 2), label, font=font, fill='black')
+        x_offset += text_width + padding*2
 
-        for col_offset, (header, color) in enumerate(zip(headers, header_colors)):
-            cell = ws.cell(row=days_table_start_row, column=days_table_start_col + col_offset, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+    return img
 
-        # Write data for Days Table
-        for idx in range(len(days)):
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col, value=days[idx])
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col + 1, value=awd_fall_days[idx])
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col + 2, value=id_fall_days[idx])
 
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col + 3, value=days[idx])
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col + 4, value=awd_spring_days[idx])
-            ws.cell(row=days_table_start_row + 1 + idx, column=days_table_start_col + 5, value=id_spring_days[idx])
+@lru_cache(maxsize=4)
+def _table_key(legend_items: tuple, font, font_size: int) -> Image:
+    """ Legend image, keyed by what draw_table_key draws """
+    return draw_table_key(dict(legend_items), font, font_size)
 
-        # Save workbook to a BytesIO buffer instead of a file
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)  # Move the cursor to the beginning of the stream
-        return output
 
+@lru_cache(maxsize=1024)
+def _text_tile(text: str, font) -> tuple:
+    """ Black text on white cropped to its bounding box, and the offset of the box from where the text is drawn """
+    left, top, right, bottom = ImageDraw.Draw(Image.new('RGB', (1, 1))).multiline_textbbox((0, 0), text, font=font)
+    tile = Image.new('RGB', (right - left, bottom - top), 'white')
+    ImageDraw.Draw(tile).text((-left, -top), text, font=font, fill="black")
+    return tile, (left, top)
 
 
 def add_weekdays(start_date : date, num_weekdays: int) -> date:
@@ -1163,6 +1141,15 @@ def add_weekdays(start_date : date, num_weekdays: int) -> date:
             num_weekdays -= 1
     return current_date
 
+def count_weekdays(start: date, end: date, weekday: int = None) -> int:
+    """ Number of Monday-Friday dates in [start, end), or only those on one weekday """
+    count = 0
+    for i in range((end - start).days):
+        day = (start.weekday() + i) % 7
+        if day < 5 and (weekday is None or day == weekday):
+            count += 1
+    return count
+
 def is_weekend(the_date : date) -> bool:
     if the_date.weekday() < 5:
         return False
@@ -1,14 +1,23 @@
-from fastapi import FastAPI, Response
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 from app.classes.month import CalMonth
 from app.classes.year import CalYear, Calendar_Input
+from app.classes import search, horizon, metrics
+from app.classes.render_cache import get_render_cache
+from app.classes.memo import get_sweep_memo
+from app.classes.executor import Overloaded, get_executor, shutdown_executor
+from app.classes.jobs import get_job_store, shutdown_job_store
+from app.classes.logs import get_logger
+import asyncio
 import base64
 import io
+from datetime import date
+from typing import Literal
+import json
 from io import BytesIO
 import time
-import itertools
 import logging
 import openpyxl
 from openpyxl.styles import PatternFill, Font, Alignment
@@ -18,6 +27,42 @@ from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
 app = FastAPI()
+log = get_logger("main")
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_job_store()
+    shutdown_executor()
+    search.shutdown_pool()
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    # CPU-bound work runs on the bounded request executor, requests it cannot admit are turned away right away
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers={"Retry-After": str(exc.retry_after)})
+
+class HeldStreamingResponse(StreamingResponse):
+    """ Streams an executor.stream() iterator and gives its executor slot back however the response ends,
+    also when the client went away before the body was started """
+    def __init__(self, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.held = content
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.held.close()
+
+if metrics.ENABLED:
+    @app.middleware("http")
+    async def time_requests(request, call_next):
+        # Only registered with CALENDAR_METRICS=1; timed by route template so hashes and job ids share one series
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        metrics.observe("calendar_request_seconds", time.perf_counter() - start,
+                        route=getattr(route, "path", "unmatched"), method=request.method)
+        return response
 
 class Month(BaseModel):
     month: int = 1
@@ -28,6 +73,29 @@ class Base_Input(BaseModel):
     day: int 
     year: int
     
+class Batch_Input(BaseModel):
+    # Explicit inputs, and/or `template` with every fall start date from first_day to last_day
+    inputs: list[Calendar_Input] = []
+    template: Calendar_Input | None = None
+    first_day: date | None = None
+    last_day: date | None = None
+
+MAX_BATCH_INPUTS = 64
+
+class Workbook_Input(BaseModel):
+    # Hashes of the options to export, in sheet order, as returned by the sweep endpoints and jobs
+    hashes: list[str]
+
+# Seconds between two progress events of /calendar/jobs/{job_id}/events
+JOB_EVENT_INTERVAL = 0.5
+
+class Horizon_Input(BaseModel):
+    # Rules and preferred start day of the first fall; the following years use the same month/day
+    template: Calendar_Input
+    years: int = 10
+    # Years (fall year) that get an image, the others only get the summary
+    render_years: list[int] = []
+    
 @app.post("/calendar/test")
 async def testThree(req: Month):
     return {
@@ -35,8 +103,7 @@ async def testThree(req: Month):
                 "day_colors": req.day_colors
             }
 
-@app.post("/calendar/table")
-async def testTwo(req: Month):
+def months_table_png() -> BytesIO:
     year = CalYear()
     awd_fall = [12, 21, 22, 19, 19]
     id_fall = [6, 21, 22, 16, 9]
@@ -47,35 +114,51 @@ async def testTwo(req: Month):
     img.save(img_bytes_io, format='PNG')
     
     img_bytes_io.seek(0)
+    return img_bytes_io
 
+@app.post("/calendar/table")
+async def testTwo(req: Month):
+    img_bytes_io = await get_executor().run(months_table_png)
     return StreamingResponse(img_bytes_io, media_type="image/png")
 
-@app.post("/calendar/month")
-async def testOne(req: Calendar_Input):
+def month_png(req: Calendar_Input) -> BytesIO:
     cmonth = CalMonth(req.year, req.month)
     img = cmonth.draw(req.width)
     img_bytes_io = io.BytesIO()
     img.save(img_bytes_io, format='PNG')
     img_bytes_io.seek(0)
-    
+    return img_bytes_io
+
+@app.post("/calendar/month")
+async def testOne(req: Calendar_Input):
+    img_bytes_io = await get_executor().run(month_png, req)
     return StreamingResponse(img_bytes_io, media_type="image/png")
 
-@app.post("/calendar/build_year")
-async def build_year(req: Calendar_Input):    
+def build_year_png(req: Calendar_Input) -> tuple:
+    """ (PNG, None) of the default schedule, or (None, reason) when no calendar can be built """
     start = time.perf_counter()
     calyear = CalYear(req)
     if calyear.valid:
-        result_image = calyear.gen_schedule()
-    
-        img_bytes_io = io.BytesIO()
-        result_image.save(img_bytes_io, format='PNG')
-        
-        img_bytes_io.seek(0)
+        params = (170, 145, 2, 12)
+        md5_hash = calyear.compute_schedule(*params)
+        if md5_hash is None:
+            return None, calyear.failure
+
+        # Drawn at most once per schedule, later requests are served from the render cache
+        img_bytes_io = io.BytesIO(search.render_cached(req, calyear, md5_hash, params))
         
         end = time.perf_counter()
-        print("Elapsed (time) = {}s".format((end - start)))
-        return StreamingResponse(img_bytes_io, media_type="image/png")
-    return None
+        log.info("build_year took %.3fs", end - start)
+        return img_bytes_io, None
+    return None, "start_window"
+
+@app.post("/calendar/build_year")
+async def build_year(req: Calendar_Input):
+    img_bytes_io, failure = await get_executor().run(build_year_png, req)
+    if img_bytes_io is None:
+        # the body stays null as before, the header says which rule failed (a CalYear.failure reason)
+        return JSONResponse(content=None, headers={"X-Calendar-Failure": failure or "unknown"})
+    return StreamingResponse(img_bytes_io, media_type="image/png")
 
 @app.post("/calendar/build_years_test")
 def build_years_request2(req: Calendar_Input):    
@@ -88,7 +171,7 @@ def build_years_request2(req: Calendar_Input):
     convo_day = 3
     winter_sess = 13
 
-    print(f"\nGenerating calendar {cnt}")
+    log.debug("generating calendar %d", cnt)
     start = time.perf_counter()
     result_image, a = calyear.gen_schedule(awd, id, convo_day, winter_sess)
     cnt += 1
@@ -101,7 +184,7 @@ def build_years_request2(req: Calendar_Input):
         returndict = {"image": img_str}
         result.append(returndict)
     end = time.perf_counter()
-    print("Elapsed (time) = {}s".format((end - start)))
+    log.debug("calendar %d took %.3fs", cnt, end - start)
         
     return result
 
@@ -115,14 +198,17 @@ def build_years_request2(req: Calendar_Input):
         for id in range(145, 150):
             for convo_day in range(2, 6):
                 for winter_sess in range(12, 16):
-                    print(f"\nGenerating calendar {cnt}")
+                    log.debug("generating calendar %d", cnt)
                     start = time.perf_counter()
-                    result_image, md5_hash = calyear.gen_schedule(awd, id, convo_day, winter_sess)
+                    md5_hash = calyear.compute_schedule(awd, id, convo_day, winter_sess)
+                    result_image = None
                     if md5_hash in result_dict:
-                        result_image = None
-                        print("Duplicate calendar, discarded")
+                        log.debug("duplicate calendar %d discarded", cnt)
                     else:
                         result_dict[md5_hash] = True
+                        if md5_hash is not None:
+                            # only draw schedules we have not seen yet
+                            result_image = calyear.render_schedule()
                     cnt += 1
                     if result_image == None:
                         pass
@@ -133,49 +219,168 @@ def build_years_request2(req: Calendar_Input):
                         returndict = {"image": img_str}
                         result.append(returndict)
                     end = time.perf_counter()
-                    print("Elapsed (time) = {}s".format((end - start)))
+                    log.debug("calendar %d took %.3fs", cnt, end - start)
         
     return result
 
 @app.post("/calendar/build_years")
-def build_years_request(req: Calendar_Input):
-    result_dict = {}
-    results = []
-    cnt = 0
-
-    # Generate all combinations of parameters
-    for awd, id_days, convo_day, winter_sess in itertools.product(
-        range(170, 181), range(145, 150), range(2, 6), range(12, 16)
-    ):
-        calyear = CalYear(req)
-        print(f"Processing calendar {cnt}")
-        result_image, md5_hash = calyear.gen_schedule(awd, id_days, convo_day, winter_sess)
-        if md5_hash in result_dict:
-            print("Duplicate calendar, discarded")
+async def build_years_request(req: Calendar_Input):
+    # The parameter grid is spread over the shared process pool (CALENDAR_WORKERS, 1 = serial)
+    return await get_executor().run(search.build_years, req)
+
+@app.post("/calendar/build_years_batch")
+async def build_years_batch(req: Batch_Input):
+    # Sweep several inputs at once and return the unique schedules of each, without images
+    # (build_years with one of the inputs afterwards reuses the memoized sweep)
+    reqs = list(req.inputs)
+    if req.template is not None and req.first_day is not None:
+        reqs += search.start_date_inputs(req.template, req.first_day, req.last_day or req.first_day)
+    if len(reqs) > MAX_BATCH_INPUTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_INPUTS} inputs per batch")
+    return await get_executor().run(search.batch_sweeps, reqs)
+
+@app.post("/calendar/horizon")
+async def plan_horizon(req: Horizon_Input):
+    # One calendar per academic year for several consecutive years, each starting after the previous summer session
+    if req.years < 1 or req.years > horizon.MAX_YEARS:
+        raise HTTPException(status_code=400, detail=f"years must be between 1 and {horizon.MAX_YEARS}")
+    try:
+        date(req.template.year, req.template.month, req.template.day)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="template start date is not a valid date")
+    return await get_executor().run(horizon.plan_horizon, req.template, req.years, req.render_years)
+
+@app.get("/calendar/cache_stats")
+def cache_stats():
+    # Hit and miss counters of the build_years sweep memo, and the load of the request executor
+    memo = get_sweep_memo()
+    return {"sweep_memo": memo.stats() if memo is not None else None, "executor": get_executor().stats(), "jobs": get_job_store().stats()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Stage timers and counters in the Prometheus text format, plus the current load of the caches and executors
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, set CALENDAR_METRICS=1")
+    gauges = []
+    memo = get_sweep_memo()
+    if memo is not None:
+        memo_stats = memo.stats()
+        gauges.append(("calendar_sweep_memo_entries", "Sweeps held in this process's memo", {}, memo_stats["entries"]))
+    executor_stats = get_executor().stats()
+    gauges.append(("calendar_executor_active", "Requests running or queued on the request executor", {}, executor_stats["active"]))
+    gauges.append(("calendar_executor_rejected", "Requests turned away by the request executor since startup", {}, executor_stats["rejected"]))
+    for state, count in get_job_store().stats().items():
+        gauges.append(("calendar_jobs", "Background sweep jobs kept in memory, by status", {"status": state}, count))
+    return Response(content=metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.post("/calendar/jobs", status_code=202)
+def submit_job(req: Calendar_Input):
+    # Run the build_years sweep in the background and answer right away; submitting the same input
+    # again while it runs returns the same job, so a client that reconnects picks up where it was
+    job = get_job_store().submit(req)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/calendar/jobs/{job.id}"}
+
+def find_job(job_id: str):
+    job = get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.get("/calendar/jobs/{job_id}")
+def job_status(job_id: str, since: int = 0):
+    # Progress, ETA and the calendars found from index `since` on (pass the previous "next" to only get new ones)
+    return find_job(job_id).snapshot(since)
+
+@app.delete("/calendar/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = get_job_store().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/calendar/jobs/{job_id}/events")
+async def job_events(job_id: str, since: int = 0):
+    # Server-sent events: a "calendar" event per calendar found from index `since` on, "progress" events,
+    # then an "end" event with the final status. Reconnecting with since=<last id + 1> resumes the stream.
+    job = find_job(job_id)
+
+    async def events():
+        sent = since
+        while True:
+            snapshot = job.snapshot(sent)
+            for result in snapshot.pop("results"):
+                yield f"event: calendar\nid: {sent}\ndata: " + json.dumps(result) + "\n\n"
+                sent += 1
+            if snapshot["status"] in ("queued", "running"):
+                yield "event: progress\ndata: " + json.dumps(snapshot) + "\n\n"
+                await asyncio.sleep(JOB_EVENT_INTERVAL)
+            else:
+                yield "event: end\ndata: " + json.dumps(snapshot) + "\n\n"
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/calendar/build_years_data")
+async def build_years_data(req: Calendar_Input):
+    # Same sweep as /calendar/build_years, but only the key dates, counts and day types of each schedule, no images
+    return await get_executor().run(search.build_years_data, req)
+
+@app.post("/calendar/build_years_manifest")
+async def build_years_manifest(req: Calendar_Input):
+    # Same sweep as /calendar/build_years, but each calendar only has an image URL: nothing is drawn or base64-encoded
+    return await get_executor().run(search.build_years_manifest, req)
+
+@app.get("/calendar/image/{md5_hash}")
+async def get_image(md5_hash: str, size: Literal["full", "thumb"] = "full", recipe: str | None = None):
+    # PNG of a calendar by its hash, drawn on first request; the hash covers every day so the image never changes.
+    # URLs handed out by the manifest and jobs carry a recipe, so they keep working after the render cache dropped the image
+    png = await get_executor().run(search.image_for_hash, md5_hash, size, recipe)
+    if png is None:
+        raise HTTPException(status_code=404, detail="Unknown calendar, request the manifest again for URLs that can draw it")
+    return Response(png, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.post("/calendar/build_years_zip")
+def build_years_zip(req: Calendar_Input):
+    # Same sweep as /calendar/build_years, as a streamed ZIP of raw PNGs with a manifest.json
+    headers = {"Content-Disposition": "attachment; filename=calendars.zip"}
+    return HeldStreamingResponse(get_executor().stream(search.iter_zip(req)), media_type="application/zip", headers=headers)
+
+@app.post("/calendar/build_years_excel")
+async def build_years_excel(req: Workbook_Input):
+    # The calendars of a sweep the client was shown, by hash, in one workbook: a summary sheet, then one sheet per option.
+    # Built from the schedule data the sweep left in the render cache, the sweep itself does not run again
+    headers = {"Content-Disposition": "attachment; filename=academic_calendars.xlsx"}
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    workbook, missing = await get_executor().run(search.build_years_workbook, req.hashes)
+    if workbook is None:
+        raise HTTPException(status_code=404, detail=f"Unknown calendars, run the sweep again: {', '.join(missing)}")
+    return StreamingResponse(workbook, media_type=media_type, headers=headers)
+
+@app.post("/calendar/build_years_stream")
+def build_years_stream(req: Calendar_Input, format: str = "ndjson", size: Literal["full", "thumb"] = "full"):
+    # Same sweep as /calendar/build_years, but each unique calendar is sent as soon as it is drawn.
+    # format=ndjson: one JSON object per line, then a {"summary": ...} line
+    # format=sse: "calendar" events, then a "summary" event
+    # size=thumb: send thumbnails, the full images stay available from /calendar/image/{hash}
+    sse = format == "sse"
+
+    def stream():
+        start = time.perf_counter()
+        stats = {}
+        for result in search.iter_years(req, stats=stats, size=size):
+            if sse:
+                yield "event: calendar\ndata: " + json.dumps(result) + "\n\n"
+            else:
+                yield json.dumps(result) + "\n"
+        stats["elapsed"] = round(time.perf_counter() - start, 3)
+        if sse:
+            yield "event: summary\ndata: " + json.dumps(stats) + "\n\n"
         else:
-            result_dict[md5_hash] = {
-                "awd": awd,
-                "id": id_days,
-                "convo_day": convo_day,
-                "winter_sess": winter_sess
-            }
-            if result_image:
-                img_bytes_io = io.BytesIO()
-                result_image.save(img_bytes_io, format='PNG')
-                img_str = base64.b64encode(img_bytes_io.getvalue()).decode("utf-8")
-                results.append({
-                    "image": img_str,
-                    "parameters": {
-                        "awd": awd,
-                        "id": id_days,
-                        "convo_day": convo_day,
-                        "winter_sess": winter_sess
-                    },
-                    "hash": md5_hash
-                })
-        cnt += 1
-
-    return results
+            yield json.dumps({"summary": stats}) + "\n"
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    # the stream holds an executor slot until it ends, the drawing itself runs on the process pool
+    return HeldStreamingResponse(get_executor().stream(stream()), media_type=media_type)
 
 
 
@@ -244,8 +449,20 @@ def generate_colored_excel_calendar(self):
     wb.save("academic_calendar.xlsx")
 
 
-@app.post("/calendar/download_excel_colored")
-async def download_excel_colored(input_data: dict):
+def colored_excel(input_data: dict) -> BytesIO:
+    # A hash from build_years identifies the schedule, serve its workbook from the render cache if we have it
+    md5_hash = input_data.get('hash')
+    cache = get_render_cache()
+    convocation_day = None
+    if cache is not None and md5_hash:
+        excel = cache.get(md5_hash, "xlsx")
+        if excel is not None:
+            return BytesIO(excel)
+        schedule = cache.get_json(md5_hash)
+        if schedule is not None:
+            # replay the exact schedule that was drawn, including its convocation day
+            convocation_day = date.fromisoformat(schedule["convocation_day"])
+
     # Initialize CalYear with inputs
     calendar_input = Calendar_Input(**input_data)
     calendar = CalYear(calendar_input)
@@ -255,19 +472,29 @@ async def download_excel_colored(input_data: dict):
     id_days = input_data.get('id')
     convo_day = input_data.get('convo_day')
     winter_sess = input_data.get('winter_sess')
+    if convocation_day is None and input_data.get('convocation_date'):
+        convocation_day = date.fromisoformat(input_data['convocation_date'])
 
-    # Generate the calendar schedule with the provided parameters
+    # Compute the calendar schedule with the provided parameters, the workbook does not need the image
     if awd and id_days and convo_day and winter_sess:
-        calendar.gen_schedule(awd, id_days, convo_day, winter_sess)
+        computed_hash = calendar.compute_schedule(awd, id_days, convo_day, winter_sess, convocation_day=convocation_day)
     else:
-        calendar.gen_schedule()
+        computed_hash = calendar.compute_schedule()
 
     # Generate Excel file
     excel_buffer = calendar.generate_colored_excel_calendar()
+    if cache is not None and computed_hash is not None:
+        cache.put(computed_hash, "xlsx", excel_buffer.getvalue())
+    return excel_buffer
 
-    # Return the file content for download
+@app.post("/calendar/download_excel_colored")
+async def download_excel_colored(input_data: dict):
     headers = {"Content-Disposition": "attachment; filename=academic_calendar.xlsx"}
-    return StreamingResponse(excel_buffer, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    excel_buffer = await get_executor().run(colored_excel, input_data)
+
+    # Return the file content for download
+    return StreamingResponse(excel_buffer, media_type=media_type, headers=headers)
 
 
 if __name__ == "__main__":
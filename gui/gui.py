@@ -1,16 +1,21 @@
 # noqa: E501
 from datetime import datetime, date
 import streamlit as st
-import base64
 from PIL import Image
 import requests
 from io import BytesIO
 import logging
+import time
 
 st.set_page_config(layout='wide')
 
 logging.basicConfig(level=logging.DEBUG, filename='app.log', filemode='w')
 
+# Seconds to wait for one answer of the backend, between two job polls, and failed polls in a row before giving up
+REQUEST_TIMEOUT = 10
+JOB_POLL_INTERVAL = 1
+JOB_POLL_RETRIES = 5
+
 # Requests Tutorial
 # https://www.geeksforgeeks.org/python-requests-tutorial/#
 
@@ -19,17 +24,100 @@ def build_years_request(dt : datetime, input_dict : dict):
     #dt = datetime.strptime(selected_year, "%Y-%m-%d")
     # Making a POST request
     payload = input_dict
-    print(payload)
+    logging.debug("Requesting build_years with %s", payload)
 
     response = requests.post("http://127.0.0.1:8000/calendar/build_years", json=payload)
     # response = requests.post("http://127.0.0.1:8000/calendar/build_years_test", json = payload)
 
-    print(response.status_code)
+    logging.debug("build_years answered %s", response.status_code)
     if response.status_code == 200:
         result = response.json()
         return result
     else:
         return None
+
+def submit_job(input_dict : dict):
+    # Starts the sweep as a background job on the backend and returns its id right away
+    try:
+        response = requests.post("http://127.0.0.1:8000/calendar/jobs", json=input_dict, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to submit job: {e}")
+        return None
+    if response.status_code != 202:
+        logging.error(f"Failed to submit job. Status code: {response.status_code}")
+        return None
+    return response.json()["job_id"]
+
+def poll_job(job_id : str, since : int):
+    # Status of the job and the calendars found from index `since` on, None if the backend did not answer
+    try:
+        response = requests.get(f"http://127.0.0.1:8000/calendar/jobs/{job_id}", params={"since": since}, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to poll job {job_id}: {e}")
+        return None
+    if response.status_code == 404:
+        # the backend restarted and forgot the job
+        return {"status": "failed", "error": "The job was lost, please submit again", "results": []}
+    if response.status_code != 200:
+        logging.error(f"Failed to poll job {job_id}. Status code: {response.status_code}")
+        return None
+    return response.json()
+
+def cancel_job(job_id : str):
+    try:
+        requests.delete(f"http://127.0.0.1:8000/calendar/jobs/{job_id}", timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to cancel job {job_id}: {e}")
+
+def follow_job(job_id : str, results : list):
+    # Polls the job until it ends, adding every new calendar (with its thumbnail) to results.
+    # Returns the final status, or None if the backend stopped answering.
+    progress = st.progress(0.0, text="Building Calendars")
+    preview = st.empty()
+    failures = 0
+    while True:
+        status = poll_job(job_id, len(results))
+        if status is None:
+            failures += 1
+            if failures >= JOB_POLL_RETRIES:
+                return None
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        failures = 0
+
+        for result in status["results"]:
+            result['preview'] = fetch_image(result['thumbnail'])
+            results.append(result)
+            if result['preview']:
+                preview.image(result['preview'], output_format="PNG")
+        if status["status"] not in ("queued", "running"):
+            progress.empty()
+            preview.empty()
+            return status
+
+        # the search is the first half of the bar, drawing the calendars it found the second
+        counts = status["progress"]
+        if counts["candidates"] < counts["total"]:
+            fraction = 0.5 * counts["candidates"] / counts["total"]
+        else:
+            fraction = 0.5 + 0.5 * counts["drawn"] / max(counts["unique"], 1)
+        eta = f", about {status['eta']:.0f}s left" if status["eta"] is not None else ""
+        progress.progress(min(fraction, 1.0), text=f"Found {len(results)} calendar(s) so far{eta}")
+        time.sleep(JOB_POLL_INTERVAL)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def fetch_image(image_url : str):
+    # Image of one option from a URL the job handed out: thumbnails for the grid, the full size one only when an option is opened.
+    # The URLs carry what the backend needs to draw the calendar again, so they keep working after its cache dropped it
+    try:
+        response = requests.get(f"http://127.0.0.1:8000{image_url}", timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to fetch image {image_url}: {e}")
+        return None
+    if response.status_code == 200:
+        return response.content
+    logging.error(f"Failed to fetch image {image_url}. Status code: {response.status_code}")
+    return None
     
 def download_calendar(input_dict, option_parameters):
     logging.debug("Attempting to download calendar with input_dict:")
@@ -41,7 +129,12 @@ def download_calendar(input_dict, option_parameters):
     req_data = {**input_dict, **option_parameters}
 
     # Make a POST request to the FastAPI endpoint
-    response = requests.post(url, json=req_data)
+    try:
+        response = requests.post(url, json=req_data, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to download calendar: {e}")
+        st.error("Failed to download calendar")
+        return None
 
     if response.status_code == 200:
         # Retrieve the file content from FastAPI
@@ -53,6 +146,20 @@ def download_calendar(input_dict, option_parameters):
         st.error("Failed to download calendar")
         return None
 
+def download_all_calendars(results):
+    # One workbook with a summary sheet and a sheet for every option shown, built from the schedules the sweep found
+    hashes = [result["hash"] for result in results]
+    try:
+        response = requests.post("http://127.0.0.1:8000/calendar/build_years_excel", json={"hashes": hashes}, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logging.error(f"Failed to download all calendars: {e}")
+        st.error("Failed to download calendars")
+        return None
+    if response.status_code == 200:
+        return response.content
+    logging.error(f"Failed to download all calendars. Status code: {response.status_code}")
+    st.error("Failed to download calendars")
+    return None
 
 
 def main():
@@ -68,6 +175,12 @@ def main():
         st.session_state.submitted = False
     if 'results' not in st.session_state:
         st.session_state.results = None
+    if 'selected' not in st.session_state:
+        st.session_state.selected = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'job_status' not in st.session_state:
+        st.session_state.job_status = None
 
     # GUI
     st.markdown("## CSULB Academic Calendar Generator")
@@ -124,6 +237,14 @@ def main():
         non_monday_commencement = st.checkbox("Commencement is Tuesday-Friday", value=st.session_state.input_dict.get('non_monday_commencement', False))
         limit_winter_session = st.checkbox("Limit winter session to 10 days long", value=st.session_state.input_dict.get('limit_winter_session', False))
         MLK_spring = st.checkbox("Spring starts after MLK", value=st.session_state.input_dict.get('MLK_spring', False))
+        convocation_policies = {
+            "seeded": "Same pick every time",
+            "first": "Earliest possible day",
+            "last": "Latest possible day",
+            "enumerate": "Show every possible day",
+        }
+        convocation_policy = st.selectbox("Convocation day (when not on a Friday)", list(convocation_policies), format_func=convocation_policies.get,
+                                          index=list(convocation_policies).index(st.session_state.input_dict.get('convocation_policy', 'seeded')))
 
     if st.button("Submit"):
         # Update session_state with inputs
@@ -142,56 +263,99 @@ def main():
             'non_monday_commencement': non_monday_commencement,
             'limit_winter_session': limit_winter_session,
             'MLK_spring': MLK_spring,
+            'convocation_policy': convocation_policy,
             'width': 350
         }
         st.session_state.submitted = True
+        st.session_state.job_id = None
+        st.session_state.job_status = None
         st.session_state.results = None
+        st.session_state.selected = None
         st.session_state.excel_contents = {}
 
     # Validate the date
     if st.session_state.first_day < date(st.session_state.first_day.year, 8, 15) or st.session_state.first_day > date(st.session_state.first_day.year, 8, 30):
         st.markdown("#### Invalid Semester Start Date\nPlease choose a date between August 15 and August 30th.")
     elif st.session_state.submitted:
-        with st.spinner("Building Calendars"):
-            results = build_years_request(st.session_state.first_day, st.session_state.input_dict)
-            st.session_state.results = results
+        # The sweep runs as a job on the backend; a rerun (or a dropped connection) resumes polling the same job
+        if st.session_state.job_id is None:
+            st.session_state.job_id = submit_job(st.session_state.input_dict)
+            st.session_state.results = []
+        if st.session_state.job_id is None:
+            st.error("Could not reach the calendar server. Please try again.")
+            st.session_state.submitted = False
+        else:
+            if st.button("Cancel", key='cancel_button'):
+                cancel_job(st.session_state.job_id)
+            # only thumbnails are kept, the full image is fetched from its URL when an option is opened
+            status = follow_job(st.session_state.job_id, st.session_state.results)
             st.session_state.submitted = False
+            if status is None:
+                st.error("Lost contact with the calendar server. Please try again.")
+            else:
+                st.session_state.job_status = status["status"]
+                if status["status"] == "cancelled":
+                    st.warning("Cancelled, showing the calendars found so far.")
+                elif status["status"] == "failed":
+                    st.error(f"Building the calendars failed: {status['error']}")
 
-    # Display results
+    # Display results: a grid of thumbnails, then the selected option at full size
     if st.session_state.results:
+        if st.button("Generate Excel for all options", key='generate_all_button'):
+            excel_content = download_all_calendars(st.session_state.results)
+            if excel_content:
+                st.session_state.excel_contents['all'] = excel_content
+        if 'all' in st.session_state.excel_contents:
+            st.download_button(
+                label="Download Excel for all options",
+                data=st.session_state.excel_contents['all'],
+                file_name="calendar_options.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key='download_all_button'
+            )
+
+        columns = st.columns(3)
         for i, result in enumerate(st.session_state.results, start=1):
-            if result["image"]:
-                # Ensure the expander remains open after interaction
-                expander_key = f"option_{i}_expander"
-                if expander_key not in st.session_state:
-                    st.session_state[expander_key] = True
-
-                with st.expander(f"Option {i}", expanded=st.session_state[expander_key]):
-                    img = base64.b64decode(result['image'])
-                    st.image(img, output_format="PNG")
-
-                    # Generate and download Excel file
-                    if st.button(f'Generate Excel for Option {i}', key=f'generate_button_{i}'):
-                        logging.debug(f"Generating Excel for Option {i}")
-                        excel_content = download_calendar(st.session_state.input_dict, result["parameters"])
-                        if excel_content:
-                            st.session_state.excel_contents[i] = excel_content
-                            st.session_state[expander_key] = True  # Keep expander open
-                            st.success(f"Excel for Option {i} generated!")
-                        else:
-                            st.error("Failed to generate Excel file.")
-
-                    # Show the download button for generated Excel
-                    if i in st.session_state.excel_contents:
-                        st.download_button(
-                            label=f"Download Excel for Option {i}",
-                            data=st.session_state.excel_contents[i],
-                            file_name=f"calendar_option_{i}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            key=f'download_button_{i}'
-                        )
+            with columns[(i - 1) % 3]:
+                if result['preview']:
+                    st.image(result['preview'], caption=f"Option {i}", output_format="PNG")
+                else:
+                    st.markdown(f"Option {i}")
+                if st.button(f"Open Option {i}", key=f'open_button_{i}'):
+                    st.session_state.selected = i
+
+        i = st.session_state.selected
+        if i is not None and i <= len(st.session_state.results):
+            result = st.session_state.results[i - 1]
+            md5_hash = result["hash"]
+            st.markdown(f"### Option {i}")
+            img = fetch_image(result["image"])
+            if img:
+                st.image(img, output_format="PNG")
+            else:
+                st.error("Failed to load the calendar image.")
+
+            # Generate and download Excel file
+            if st.button(f'Generate Excel for Option {i}', key=f'generate_button_{i}'):
+                logging.debug(f"Generating Excel for Option {i}")
+                excel_content = download_calendar(st.session_state.input_dict, {**result["parameters"], "hash": md5_hash})
+                if excel_content:
+                    st.session_state.excel_contents[md5_hash] = excel_content
+                    st.success(f"Excel for Option {i} generated!")
+                else:
+                    st.error("Failed to generate Excel file.")
+
+            # Show the download button for generated Excel
+            if md5_hash in st.session_state.excel_contents:
+                st.download_button(
+                    label=f"Download Excel for Option {i}",
+                    data=st.session_state.excel_contents[md5_hash],
+                    file_name=f"calendar_option_{i}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key=f'download_button_{i}'
+                )
     else:
-        if st.session_state.submitted:
+        if st.session_state.job_status == "done":
             st.error("No valid calendars found. Please adjust your settings.")
 
 
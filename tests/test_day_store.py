@@ -0,0 +1,27 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from app.classes.year import CalYear, Calendar_Input, Day
+
+
+def make_input(**flags) -> Calendar_Input:
+    inputs = dict.fromkeys(["even", "friday_convocation", "monday_fall", "extended_fall", "monday_final", "summer_sessession_start",
+                            "cesar_chavez", "monday_spring_final", "non_monday_commencement", "limit_winter_session", "MLK_spring"], False)
+    inputs.update(flags)
+    return Calendar_Input(**inputs)
+
+
+def test_summer_session_past_thirteen_months():
+    # Starting Aug 21 with the longest targets, summer session ends in September of the next year
+    calyear = CalYear(make_input(year=2025, month=8, day=21, extended_fall=True, monday_final=True, cesar_chavez=True))
+    assert calyear.compute_schedule(179, 149, 5, 15) is not None
+    thirteen_months = date(2025, 8, 1) + relativedelta(months=13)
+    assert max(calyear.cal_dict.keys()) >= thirteen_months
+
+
+def test_friday_convocation_counted_once():
+    # The convocation Friday is one AWD day, the fall and spring counts add up to the AWD target
+    calyear = CalYear(make_input(year=2025, month=8, day=18, friday_convocation=True))
+    assert calyear.compute_schedule(170, 145, 4, 15) is not None
+    assert calyear.convocation_day == date(2025, 8, 22)
+    assert calyear.day_awd_count["fall"][Day.FRIDAY] == 17
+    assert sum(calyear.day_awd_count["fall"].values()) + sum(calyear.day_awd_count["spring"].values()) == 170
@@ -0,0 +1,156 @@
+import io
+import json
+import time
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from app.classes import memo, metrics, render_cache
+from app.main import app
+
+INPUT = {"year": 2025, "month": 8, "day": 18, "even": False, "friday_convocation": False, "monday_fall": False,
+         "extended_fall": True, "monday_final": True, "summer_sessession_start": False, "cesar_chavez": True,
+         "monday_spring_final": False, "non_monday_commencement": False, "limit_winter_session": False, "MLK_spring": False}
+
+# unique schedules of INPUT
+OPTIONS = 22
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # serial sweeps, and a render cache and memo of this test's own
+    monkeypatch.setenv("CALENDAR_WORKERS", "1")
+    monkeypatch.setenv("CALENDAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("CALENDAR_SHM_CACHE_MB", "0")
+    monkeypatch.setenv("CALENDAR_MEMO_ENTRIES", "8")
+    monkeypatch.setattr(render_cache, "_cache", None)
+    monkeypatch.setattr(memo, "_memo", None)
+    return TestClient(app)
+
+
+def test_build_years_stream(client):
+    response = client.post("/calendar/build_years_stream", params={"size": "thumb"}, json=INPUT)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines.pop()["summary"]
+    assert summary["unique"] == len(lines) == OPTIONS
+    assert len({line["hash"] for line in lines}) == OPTIONS
+    assert all(line["image"] for line in lines)
+
+
+def test_build_years_batch(client):
+    batch = {"template": INPUT, "first_day": "2025-08-18", "last_day": "2025-08-20"}
+    response = client.post("/calendar/build_years_batch", json=batch)
+    assert response.status_code == 200
+    sweeps = response.json()
+    assert [(entry["input"]["month"], entry["input"]["day"]) for entry in sweeps] == [(8, 18), (8, 19), (8, 20)]
+    assert len(sweeps[0]["schedules"]) == OPTIONS
+
+    too_many = {"inputs": [INPUT] * 65}
+    assert client.post("/calendar/build_years_batch", json=too_many).status_code == 400
+
+
+def test_build_years_data(client):
+    response = client.post("/calendar/build_years_data", json=INPUT)
+    assert response.status_code == 200
+    results = response.json()
+    assert len(results) == OPTIONS
+    for result in results:
+        schedule = result["schedule"]
+        assert schedule["num_awd"] == result["parameters"]["awd"]
+        assert schedule["convocation_day"] == result["parameters"]["convocation_date"]
+        assert sum(length for _, length in schedule["days"]["runs"]) > 365
+
+
+def test_manifest_images(client, tmp_path):
+    response = client.post("/calendar/build_years_manifest", json=INPUT)
+    assert response.status_code == 200
+    manifest = response.json()
+    assert len(manifest) == OPTIONS
+    entry = manifest[0]
+
+    thumbnail = client.get(entry["thumbnail"])
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/png"
+    assert thumbnail.content.startswith(b"\x89PNG")
+
+    # evicted from the cache, the recipe in the URL draws it again; the bare hash cannot
+    for path in tmp_path.rglob("*.png"):
+        path.unlink()
+    assert client.get(entry["image"]).status_code == 200
+    for path in tmp_path.rglob("*"):
+        if path.is_file():
+            path.unlink()
+    assert client.get(f"/calendar/image/{entry['hash']}").status_code == 404
+
+    # a recipe only draws the schedule it was made for
+    other = manifest[1]["image"].split("?", 1)[1]
+    assert client.get(f"/calendar/image/{entry['hash']}?{other}").status_code == 404
+
+
+def test_build_years_zip(client):
+    response = client.post("/calendar/build_years_zip", json=INPUT)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert "manifest.json" in names
+    assert sum(name.endswith(".png") for name in names) == OPTIONS
+
+
+def wait_for(client, job_id: str) -> dict:
+    for _ in range(600):
+        status = client.get(f"/calendar/jobs/{job_id}").json()
+        if status["status"] not in ("queued", "running"):
+            return status
+        time.sleep(0.1)
+    raise AssertionError("the job did not end")
+
+
+def test_jobs(client):
+    submitted = client.post("/calendar/jobs", json=INPUT)
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    # the same input while it runs is the same job
+    assert client.post("/calendar/jobs", json=INPUT).json()["job_id"] == job_id
+
+    status = wait_for(client, job_id)
+    assert status["status"] == "done"
+    assert len(status["results"]) == status["progress"]["unique"] == OPTIONS
+    assert client.get(status["results"][0]["thumbnail"]).status_code == 200
+    assert client.get(f"/calendar/jobs/{job_id}", params={"since": OPTIONS}).json()["results"] == []
+
+    other = client.post("/calendar/jobs", json=dict(INPUT, day=19)).json()["job_id"]
+    assert client.delete(f"/calendar/jobs/{other}").status_code == 200
+    status = wait_for(client, other)
+    assert status["status"] == "cancelled"
+    assert status["progress"]["candidates"] < status["progress"]["total"]
+
+    assert client.get("/calendar/jobs/unknown").status_code == 404
+
+
+def test_metrics(client, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    client.post("/calendar/build_years_data", json=INPUT)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    samples = dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+    candidates = sum(float(value) for name, value in samples.items() if name.startswith("calendar_candidates_total"))
+    failures = sum(float(value) for name, value in samples.items() if name.startswith("calendar_rule_failures_total"))
+    assert candidates == 880
+    assert failures == 880 - OPTIONS
+    assert "calendar_executor_active" in samples
+
+
+def test_build_years_excel(client):
+    hashes = [entry["hash"] for entry in client.post("/calendar/build_years_manifest", json=INPUT).json()]
+    response = client.post("/calendar/build_years_excel", json={"hashes": hashes})
+    assert response.status_code == 200
+    assert len(zipfile.ZipFile(io.BytesIO(response.content)).namelist()) > OPTIONS
+
+    unknown = client.post("/calendar/build_years_excel", json={"hashes": hashes[:1] + ["0" * 32]})
+    assert unknown.status_code == 404
+    assert "0" * 32 in unknown.json()["detail"]
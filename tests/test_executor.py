@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import pytest
+from starlette.requests import ClientDisconnect
+from app.classes.executor import BoundedExecutor, Overloaded
+from app.main import HeldStreamingResponse
+
+
+def chunks():
+    yield b"a"
+    yield b"b"
+
+
+def test_admission():
+    executor = BoundedExecutor(workers=1, max_queue=1)
+    started, finish = threading.Event(), threading.Event()
+
+    def blocked():
+        started.set()
+        finish.wait(5)
+        return "done"
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(blocked))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0)
+        assert started.wait(5)
+        with pytest.raises(Overloaded) as rejected:
+            await executor.run(lambda: "rejected")
+        assert rejected.value.status_code == 429
+        finish.set()
+        return await running, await queued
+
+    assert asyncio.run(scenario()) == ("done", "queued")
+    assert executor.stats()["active"] == 0
+    assert executor.stats()["rejected"] == 1
+
+    executor.shutdown()
+    with pytest.raises(Overloaded) as closed:
+        executor.stream(chunks())
+    assert closed.value.status_code == 503
+
+
+def test_stream_releases_when_exhausted():
+    executor = BoundedExecutor(workers=1, max_queue=0)
+    assert list(executor.stream(chunks())) == [b"a", b"b"]
+    assert executor.stats()["active"] == 0
+
+
+def test_stream_dropped_before_reading():
+    executor = BoundedExecutor(workers=1, max_queue=0)
+    for _ in range(3):
+        held = executor.stream(chunks())
+        with pytest.raises(Overloaded):
+            executor.stream(chunks())
+        held.close()
+        held.close()
+    assert executor.stats()["active"] == 0
+    assert executor.stats()["completed"] == 3
+
+
+def test_response_releases_when_client_left_before_start():
+    executor = BoundedExecutor(workers=1, max_queue=0)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    for _ in range(3):
+        response = HeldStreamingResponse(executor.stream(chunks()), media_type="application/x-ndjson")
+        with pytest.raises(ClientDisconnect):
+            asyncio.run(response(scope, receive, send))
+    assert executor.stats()["active"] == 0
@@ -0,0 +1,57 @@
+from io import BytesIO
+import pytest
+from openpyxl import load_workbook
+from app.classes import excel, memo, render_cache, search
+from app.classes.year import CalYear, Calendar_Input
+
+
+def make_input(**flags) -> Calendar_Input:
+    inputs = dict.fromkeys(["even", "friday_convocation", "monday_fall", "extended_fall", "monday_final", "summer_sessession_start",
+                            "cesar_chavez", "monday_spring_final", "non_monday_commencement", "limit_winter_session", "MLK_spring"], False)
+    inputs.update(flags)
+    return Calendar_Input(**inputs)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALENDAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("CALENDAR_SHM_CACHE_MB", "0")
+    monkeypatch.setenv("CALENDAR_MEMO_ENTRIES", "0")
+    monkeypatch.setattr(render_cache, "_cache", None)
+    monkeypatch.setattr(memo, "_memo", None)
+    return tmp_path
+
+
+def rows(workbook: BytesIO) -> dict:
+    wb = load_workbook(workbook)
+    return {ws.title: [[cell.value for cell in row] for row in ws.iter_rows()] for ws in wb.worksheets}
+
+
+def test_sweep_workbook_from_cached_schedules(cache_dir, monkeypatch):
+    req = make_input(year=2025, month=8, day=18, extended_fall=True, monday_final=True, cesar_chavez=True)
+    results = search.build_years_data(req, workers=1)
+    hashes = [result["hash"] for result in results][::-1]
+    assert len(hashes) > 1
+
+    expected = []
+    for md5_hash in hashes:
+        result = next(result for result in results if result["hash"] == md5_hash)
+        calyear = CalYear(req)
+        calyear.compute_schedule(*search.params_from(result["parameters"]))
+        expected.append((md5_hash, result["parameters"], calyear))
+    expected = rows(excel.sweep_workbook(expected))
+
+    def solve(*args, **kwargs):
+        raise AssertionError("the workbook must not run the solver")
+    monkeypatch.setattr(CalYear, "compute_schedule", solve)
+    monkeypatch.setattr(CalYear, "compute_finish", solve)
+
+    workbook, missing = search.build_years_workbook(hashes)
+    assert missing == []
+    assert rows(workbook) == expected
+    assert len(expected) == len(hashes) + 1
+
+
+def test_sweep_workbook_unknown_hash(cache_dir):
+    unknown = "0" * 32
+    assert search.build_years_workbook([unknown]) == (None, [unknown])
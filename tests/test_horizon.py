@@ -0,0 +1,34 @@
+from datetime import date
+from fastapi.testclient import TestClient
+from app.classes import horizon
+from app.classes.year import Calendar_Input
+from app.main import app
+
+
+def make_input(**flags) -> Calendar_Input:
+    inputs = dict.fromkeys(["even", "friday_convocation", "monday_fall", "extended_fall", "monday_final", "summer_sessession_start",
+                            "cesar_chavez", "monday_spring_final", "non_monday_commencement", "limit_winter_session", "MLK_spring"], False)
+    inputs.update(flags)
+    return Calendar_Input(**inputs)
+
+
+def test_year_inputs_closest_first():
+    starts = [date(req.year, req.month, req.day) for req in horizon.year_inputs(make_input(year=2025, month=8, day=20), 2026)]
+    assert starts[0] == date(2026, 8, 20)
+    assert all(date(2026, 8, 15) <= start <= date(2026, 8, 31) and start.weekday() < 5 for start in starts)
+    assert len(set(starts)) == sum(1 for day in range(15, 32) if date(2026, 8, day).weekday() < 5)
+
+
+def test_year_inputs_leap_day_template():
+    # February 29th only exists in leap years, the other years take February 28th
+    template = make_input(year=2024, month=2, day=29)
+    for year in (2024, 2025):
+        starts = [date(req.year, req.month, req.day) for req in horizon.year_inputs(template, year)]
+        # every August start day comes after the preferred day, the earliest is the closest
+        assert starts == sorted(starts)
+
+
+def test_horizon_rejects_invalid_template_date():
+    template = make_input(year=2025, month=2, day=30).model_dump()
+    response = TestClient(app).post("/calendar/horizon", json={"template": template, "years": 2})
+    assert response.status_code == 422
@@ -0,0 +1,68 @@
+import pytest
+from app.classes import memo, render_cache, search
+from app.classes.memo import SweepMemo, input_digest
+from app.classes.year import Calendar_Input
+
+
+def make_input(**flags) -> Calendar_Input:
+    inputs = dict.fromkeys(["even", "friday_convocation", "monday_fall", "extended_fall", "monday_final", "summer_sessession_start",
+                            "cesar_chavez", "monday_spring_final", "non_monday_commencement", "limit_winter_session", "MLK_spring"], False)
+    inputs.update(flags)
+    return Calendar_Input(**inputs)
+
+
+@pytest.fixture
+def fresh_memo(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALENDAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("CALENDAR_SHM_CACHE_MB", "0")
+    monkeypatch.setenv("CALENDAR_MEMO_ENTRIES", "8")
+    monkeypatch.setattr(render_cache, "_cache", None)
+    monkeypatch.setattr(memo, "_memo", None)
+
+
+def test_lru_and_ttl(monkeypatch):
+    entries = SweepMemo(max_entries=2, ttl=60)
+    entries.put("a", 1)
+    entries.put("b", 2)
+    assert entries.get("a") == 1
+    entries.put("c", 3)
+    # "b" was the least recently used
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+
+    now = memo.time.monotonic()
+    monkeypatch.setattr(memo.time, "monotonic", lambda: now + 61)
+    assert entries.get("a") is None
+    assert entries.stats()["entries"] == 1
+
+
+def test_input_digest_follows_field_values():
+    req = make_input(year=2025, month=8, day=18)
+    assert input_digest(req) == input_digest(make_input(year=2025, month=8, day=18))
+    assert input_digest(req) != input_digest(make_input(year=2025, month=8, day=19))
+
+
+def test_sweep_is_replayed(fresh_memo, monkeypatch):
+    req = make_input(year=2025, month=8, day=18, extended_fall=True, monday_final=True, cesar_chavez=True)
+    first, second = {}, {}
+    found = search.sweep(req, workers=1, stats=first)
+
+    def evaluate(task):
+        raise AssertionError("a memoized sweep must not search again")
+    monkeypatch.setattr(search, "evaluate_candidate", evaluate)
+    assert search.sweep(req, workers=1, stats=second) == found
+    assert (first["memoized"], second["memoized"]) == (False, True)
+    assert second["unique"] == first["unique"] == len(found)
+
+    # another process on the host finds the sweep in the shared render cache
+    memo.get_sweep_memo().clear()
+    assert search.sweep(req, workers=1) == found
+
+
+def test_random_policy_is_never_replayed(fresh_memo):
+    req = make_input(year=2025, month=8, day=18, extended_fall=True, monday_final=True, cesar_chavez=True, convocation_policy="random")
+    stats = {}
+    search.sweep(req, workers=1)
+    search.sweep(req, workers=1, stats=stats)
+    assert stats["memoized"] is False
+    assert memo.get_sweep_memo().stats()["entries"] == 0
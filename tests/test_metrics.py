@@ -0,0 +1,46 @@
+import multiprocessing as mp
+import pytest
+from app.classes import metrics
+
+UNIQUE = ("calendar_schedules_total", (("result", "unique"),))
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+
+def count_in_worker(amount: int) -> dict:
+    metrics.inc("calendar_schedules_total", amount, result="unique")
+    metrics.observe("calendar_stage_seconds", 0.002, stage="awd")
+    return metrics.drain()
+
+
+def test_main_process_does_not_drain(enabled):
+    metrics.inc("calendar_schedules_total", result="unique")
+    assert metrics.drain() is None
+    assert metrics._counters[UNIQUE] == 1
+
+
+def test_pool_workers_send_back_only_their_own_counts(enabled):
+    # counted before the pool forks its workers, they must not send these back
+    metrics.inc("calendar_schedules_total", 1000, result="unique")
+    with mp.get_context("fork").Pool(2) as pool:
+        for delta in pool.map(count_in_worker, [1] * 4, chunksize=1):
+            metrics.merge(delta)
+    assert metrics._counters[UNIQUE] == 1004
+    buckets, total, count = metrics._histograms[("calendar_stage_seconds", (("stage", "awd"),))]
+    assert count == 4
+    assert sum(buckets) == 4
+
+
+def test_render(enabled):
+    metrics.inc("calendar_schedules_total", 3, result="unique")
+    metrics.observe("calendar_stage_seconds", 0.002, stage="awd")
+    text = metrics.render([("calendar_jobs", "Jobs by state", {"state": "running"}, 2)])
+    assert 'calendar_schedules_total{result="unique"} 3' in text
+    assert 'calendar_stage_seconds_bucket{stage="awd",le="0.0025"} 1' in text
+    assert 'calendar_stage_seconds_count{stage="awd"} 1' in text
+    assert 'calendar_jobs{state="running"} 2' in text
@@ -0,0 +1,47 @@
+import os
+from app.classes.render_cache import RenderCache
+
+HASHES = [f"{i:032x}" for i in range(1, 6)]
+
+
+def test_put_get(tmp_path):
+    cache = RenderCache(str(tmp_path), 1024 * 1024)
+    assert cache.get(HASHES[0], "png") is None
+    cache.put(HASHES[0], "png", b"image")
+    cache.put_json(HASHES[0], {"hash": HASHES[0]})
+    assert cache.get(HASHES[0], "png") == b"image"
+    assert cache.get_json(HASHES[0]) == {"hash": HASHES[0]}
+    assert cache.has(HASHES[0], "png") and not cache.has(HASHES[0], "thumb")
+    assert os.path.exists(tmp_path / HASHES[0][:2] / f"{HASHES[0]}.png")
+
+
+def test_rejects_what_is_not_a_hash(tmp_path):
+    cache = RenderCache(str(tmp_path), 1024 * 1024)
+    cache.put("../escape", "png", b"image")
+    assert cache.get("../escape", "png") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path), 350)
+    for md5_hash in HASHES[:3]:
+        cache.put(md5_hash, "png", b"x" * 100)
+    past = os.path.getmtime(cache.path(HASHES[2], "png")) - 60
+    for age, md5_hash in enumerate(HASHES[:3]):
+        os.utime(cache.path(md5_hash, "png"), (past + age, past + age))
+    # reading marks the oldest as recently used, the next write then evicts the second oldest
+    assert cache.get(HASHES[0], "png") is not None
+    cache.put(HASHES[3], "png", b"x" * 100)
+    assert cache.get(HASHES[1], "png") is None
+    assert all(cache.get(md5_hash, "png") is not None for md5_hash in (HASHES[0], HASHES[2], HASHES[3]))
+
+
+def test_fallback_tier(tmp_path):
+    disk = RenderCache(str(tmp_path / "disk"), 1024 * 1024)
+    shm = RenderCache(str(tmp_path / "shm"), 1024 * 1024, fallback=disk, name="shm")
+    disk.put(HASHES[0], "png", b"image")
+    assert shm.get(HASHES[0], "png") == b"image"
+    # copied into the front tier on the way
+    assert os.path.exists(shm.path(HASHES[0], "png"))
+    shm.put(HASHES[1], "png", b"other")
+    assert disk.get(HASHES[1], "png") == b"other"
@@ -0,0 +1,47 @@
+from collections import Counter
+import pytest
+from app.classes import metrics, search
+from app.classes.year import CalYear, Calendar_Input, FAILURE_MESSAGES
+
+
+def make_input(**flags) -> Calendar_Input:
+    inputs = dict.fromkeys(["even", "friday_convocation", "monday_fall", "extended_fall", "monday_final", "summer_sessession_start",
+                            "cesar_chavez", "monday_spring_final", "non_monday_commencement", "limit_winter_session", "MLK_spring"], False)
+    inputs.update(flags)
+    return Calendar_Input(**inputs)
+
+
+# Between them these prune at every stage: weekend start, failed instructional days states,
+# spring past May 31st from fewer instructional days, and AWD totals on both sides of the bounds
+INPUTS = [
+    make_input(year=2025, month=8, day=18, extended_fall=True, monday_final=True, cesar_chavez=True),
+    make_input(year=2025, month=8, day=18, friday_convocation=True),
+    make_input(year=2026, month=8, day=24, even=True, monday_fall=True, MLK_spring=True),
+    make_input(year=2026, month=8, day=28, extended_fall=True, friday_convocation=True, monday_spring_final=True),
+    make_input(year=2025, month=8, day=23),
+]
+
+
+@pytest.mark.parametrize("req", INPUTS)
+def test_pruned_sweep_matches_brute_force(req, monkeypatch):
+    expected = {}
+    for params in search.parameter_grid():
+        calyear = CalYear(req)
+        md5_hash = calyear.compute_schedule(*params)
+        expected[params] = (md5_hash, calyear.convocation_day) if md5_hash is not None else calyear.failure
+
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+    evaluator = search.StagedEvaluator(req)
+    for params in search.parameter_grid():
+        schedules, pruned, failure = evaluator.evaluate(params)
+        if isinstance(expected[params], str):
+            assert (schedules, failure) == ([], expected[params]), params
+            assert failure in FAILURE_MESSAGES
+        else:
+            assert (schedules, pruned, failure) == ([expected[params]], None, None), params
+
+    # one failure per candidate without a schedule, as if every candidate had run every stage
+    failures = Counter(reason for reason in expected.values() if isinstance(reason, str))
+    counted = {labels[0][1]: value for (name, labels), value in metrics._counters.items() if name == "calendar_rule_failures_total"}
+    assert counted == dict(failures)